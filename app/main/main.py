@@ -1,5 +1,4 @@
 import streamlit as st
-import pandas as pd
 import sys
 sys.path.append('.')
 sys.path.append('/Users/simon/Documents/Projects/data-viz/twitch-web-analytics')
@@ -7,6 +6,8 @@ import src
 print(dir(src), src.__file__)
 from src.app.pages import set_home, set_data, set_analysis, set_graph_analysis
 from src.app.constants import *
+from src.app.data_service import load_streamers_data
+from src.user import User
 
 st.set_page_config(page_title='Twitch Analysis',
                    page_icon='https://www.google.com/s2/favicons?domain=www.twitch.com',
@@ -37,14 +38,10 @@ hide_streamlit_menu_style = """
 """
 st.markdown(hide_streamlit_menu_style, unsafe_allow_html=True)
 
-data_path = "data/streamers_small.feather"
-
-@st.cache_data(persist=True, show_spinner=False)
-def load_data():
-    df = pd.read_feather(data_path)
-    return df
-
-df = load_data()
+# The dataset is memory-mapped once per process and shared by all the sessions (descriptions and follows are loaded lazily)
+df = load_streamers_data(data_path).frame()
+# The follows of the users are read from the dataset the graphs are made from
+User.use_follows_dataset(graph_data_path)
 
 if menu == 'Introduction':
     set_home()
@@ -6,6 +6,10 @@ path_rates = 'src/data/OECD/DP_LIVE_16072021155836489.csv'
 
 title = 'Network Analysis of Hispanic streamers in the Twitch community'
 
+# Dataset loaded by the dashboard and dataset the graphs of common follows are made from
+data_path = "data/streamers_small.feather"
+graph_data_path = "data/streamers.feather"
+
 # SIDEBAR ==============================================================
 sidebar_text = '''
 Made for Web Analytics by:
@@ -103,7 +107,7 @@ In order to reproduce the Analysis we made on this dashboard you can follow the
 1. Clone the repository of this project at https://github.com/Enver-group/twitch-web-analytics
 2. Download the requirements of the project with `pip install -r requirements.txt`
 3. You can use our own dataset in the data/ directory or setup the Twitch API Keys in your environmental variables 
-and create one yourself with the command `python -m src.data --root_user {YOUR SELECTED STREAMER} --output_file "data/streamers.feather" --max_users 10000`
+and create one yourself with the command `python -m src.data --root_user {YOUR SELECTED STREAMER} --output_file "data/streamers.parquet" --max_users 10000`
 4. Go though our notebooks and source code and run the experiments and analysis we made for yourself.
 5. Run the streamlit app with `streamlit run app/main/main.py` to visualize the results in a dashboard like this one.
 '''
\ No newline at end of file
@@ -0,0 +1,193 @@
+import os, json, logging, threading
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+import click
+
+from ..data.storage import dataset_version
+
+logger = logging.getLogger(os.path.basename(__name__).split(".")[-1])
+
+# Heavy columns that are only converted to pandas when a page asks for them
+LAZY_COLUMNS = ["description", "user_follows"]
+
+# Columns the pages rank the streamers by and whether they are sorted in ascending order
+RANKING_COLUMNS = {"num_followers": False, "view_count": False, "created_at": True, "name": True}
+
+# Datasets already opened by this process, by their path
+_loaded_data = {}
+
+
+class StreamersData:
+    """
+    Read-only view of the dataset of streamers shared by all the sessions of the dashboard.
+
+    Feather/Arrow files (written uncompressed by `write_dataset`) are memory-mapped, so opening the dataset
+    does not read it and its pages are shared by all the processes that map it. The pages of the dashboard
+    get projections of the columns they use: as an arrow table (zero-copy) or as a pandas dataframe, which is
+    converted once per process and set of columns (the numeric columns without nulls are not copied).
+    The descriptions and follows (LAZY_COLUMNS) are left out of the default projection.
+    The dataframes are shared, so they must not be modified in place.
+
+    The rows sorted by each of the RANKING_COLUMNS are precomputed and stored with the dataset (see `build_sort_index`),
+    so the top n streamers by a column are the first n entries of its order instead of a sort of the whole dataset.
+
+    Parameters
+    ----------
+    path : str
+        The path of the dataset (.feather, .arrow or .parquet).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.version = dataset_version(path)
+        if path.endswith(".feather") or path.endswith(".arrow"):
+            self.table = feather.read_table(pa.memory_map(path), memory_map=True)
+        elif path.endswith(".parquet"):
+            self.table = pq.read_table(path, memory_map=True)
+        else:
+            raise ValueError(f"Unknown format of the dataset {path}. Use a .feather, .arrow or .parquet file")
+        self._frames = {}
+        self._orders = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.table.num_rows
+
+    @property
+    def columns(self):
+        return self.table.column_names
+
+    def arrow(self, columns=None):
+        """
+        Returns the arrow table with the given {columns} (all of them by default) without copying them.
+        """
+        return self.table if columns is None else self.table.select(list(columns))
+
+    def frame(self, columns=None, rows=None):
+        """
+        Returns a pandas dataframe with the given {columns} (all but the LAZY_COLUMNS by default) of all the
+        streamers or, if given, of the {rows} (positions in the dataset). The dataframes of all the rows are
+        cached, so they are only converted the first time.
+        """
+        if columns is None:
+            columns = [c for c in self.columns if c not in LAZY_COLUMNS]
+        columns = tuple(columns)
+        if rows is not None:
+            return self._to_pandas(self.arrow(columns).take(np.asarray(rows, dtype=np.int64)))
+        with self._lock:
+            if columns not in self._frames:
+                self._frames[columns] = self._to_pandas(self.arrow(columns))
+            return self._frames[columns]
+
+    def order(self, column):
+        """
+        Returns the rows of the dataset sorted by {column} (one of the RANKING_COLUMNS, in its direction and with the nulls last).
+        """
+        with self._lock:
+            if self._orders is None:
+                self._orders = load_sort_index(self)
+        return self._orders[column]
+
+    def sorted_rows(self, column, rows=None, n=None):
+        """
+        Returns the first {n} rows (all of them if None) of the dataset sorted by {column}. If {rows} is given,
+        only those rows are sorted, keeping them in the precomputed order of the whole dataset.
+        """
+        order = self.order(column)
+        if rows is not None:
+            selected = np.zeros(len(self), dtype=bool)
+            selected[np.asarray(rows, dtype=np.int64)] = True
+            order = order[selected[order]]
+        return order if n is None else order[:n]
+
+    @staticmethod
+    def _to_pandas(table):
+        df = table.to_pandas(split_blocks=True)
+        # Partition columns of parquet datasets are read as dictionaries
+        for col in df.columns:
+            if df[col].dtype.name == "category":
+                df[col] = df[col].astype(object)
+        if "id" in df.columns and df["id"].dtype != np.int64:
+            df["id"] = pd.to_numeric(df["id"]).astype("int64")
+        return df
+
+
+def load_streamers_data(path):
+    """
+    Returns the StreamersData of the dataset at {path}. It is opened once per process and again only if the file changes.
+    """
+    version = dataset_version(path)
+    data = _loaded_data.get(path)
+    if data is None or data.version != version:
+        logger.info(f"Memory-mapping the dataset {path}...")
+        data = StreamersData(path)
+        _loaded_data[path] = data
+    return data
+
+
+def get_sort_index_path(dataset_path):
+    """
+    Returns the directory where the sort index of the dataset at {dataset_path} is stored (e.g. data/streamers_small.order).
+    """
+    return os.path.splitext(dataset_path.rstrip("/"))[0] + ".order"
+
+
+def build_sort_index(data):
+    """
+    Computes the rows of the StreamersData {data} sorted by each of the RANKING_COLUMNS (a stable sort, nulls last)
+    and saves them as .npy files next to its dataset.
+    """
+    path = get_sort_index_path(data.path)
+    logger.info(f"Building the sort index of {data.path}...")
+    os.makedirs(path, exist_ok=True)
+    orders = {}
+    for column, ascending in RANKING_COLUMNS.items():
+        if column not in data.columns:
+            continue
+        order = pc.array_sort_indices(data.table.column(column), order="ascending" if ascending else "descending", null_placement="at_end")
+        orders[column] = order.to_numpy().astype(np.int32)
+        np.save(os.path.join(path, f"{column}.npy"), orders[column])
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump({"version": data.version, "columns": list(orders)}, f)
+    return orders
+
+
+def load_sort_index(data):
+    """
+    Returns the sort index of the StreamersData {data} (a dict with the sorted rows by each column), memory-mapped
+    from the directory next to its dataset. It is built if it does not exist or the dataset changed.
+    """
+    path = get_sort_index_path(data.path)
+    meta_file = os.path.join(path, "meta.json")
+    if os.path.exists(meta_file):
+        with open(meta_file) as f:
+            meta = json.load(f)
+        files = [os.path.join(path, f"{column}.npy") for column in meta["columns"]]
+        if meta["version"] == data.version and all(os.path.exists(f) for f in files):
+            return {column: np.load(f, mmap_mode="r") for column, f in zip(meta["columns"], files)}
+    return build_sort_index(data)
+
+
+@click.command()
+@click.option("--data_path", type=click.Path(exists=True), default="data/streamers_small.feather",
+    help="The dataset loaded by the dashboard")
+def main(data_path=None):
+    """
+    Build the sort index of the dataset of the dashboard:
+
+    python -m src.app.data_service --data_path data/streamers_small.feather
+    """
+    build_sort_index(load_streamers_data(data_path))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s.%(funcName)s - %(levelname)s: %(message)s',
+        datefmt='%b %d %H:%M',
+        level=logging.INFO
+    )
+    main()
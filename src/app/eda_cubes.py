@@ -0,0 +1,193 @@
+import os, json, logging
+import pandas as pd
+import click
+
+from ..data.storage import read_dataset, dataset_version
+
+logger = logging.getLogger(os.path.basename(__name__).split(".")[-1])
+
+# Dimensions and measures of the cube of the exploratory analysis
+DIMENSIONS = ["last_game_played_name", "broadcaster_type", "month"]
+MEASURES = ["num_followers", "view_count"]
+
+# Aggregations of the cube by each dimension stored with it (one feather file each)
+ROLLUPS = DIMENSIONS
+
+# Number of rows (the first ones of the dataset) the head rollups aggregate, as the barplot did with head(n_max)
+HEAD_ROWS = 5000
+
+# Cubes already loaded by this process, by the path of their dataset
+_loaded_cubes = {}
+
+
+def build_cube(df):
+    """
+    Returns the cube of the dataframe of streamers {df}: one row per (game, broadcaster type, month of creation)
+    with the number of streamers ("count") and, for each measure, its sum ("{measure}_sum"), its number of
+    non-null values ("{measure}_count") and the streamer with its highest value ("top_{measure}_name" and "top_{measure}").
+    Missing values of the dimensions are kept as groups of their own.
+    """
+    df = df[["name", "last_game_played_name", "broadcaster_type", "created_at"] + MEASURES].assign(
+        month=lambda x: pd.to_datetime(x.created_at, utc=True).dt.strftime("%Y-%m")
+    )
+    aggregations = {"count": ("name", "size")}
+    for measure in MEASURES:
+        aggregations[f"{measure}_sum"] = (measure, "sum")
+        aggregations[f"{measure}_count"] = (measure, "count")
+    cube = df.groupby(DIMENSIONS, dropna=False).agg(**aggregations).reset_index()
+    for measure in MEASURES:
+        # The first row of each group once sorted by the measure (nulls last)
+        top = df.sort_values(measure, ascending=False, kind="stable").drop_duplicates(subset=DIMENSIONS)
+        top = top[DIMENSIONS + ["name", measure]].rename(columns={"name": f"top_{measure}_name", measure: f"top_{measure}"})
+        cube = cube.merge(top, on=DIMENSIONS, how="left")
+    return cube
+
+
+def rollup(cube, by):
+    """
+    Aggregates the {cube} (or a rollup of it) by the dimension {by}, dropping the missing values of {by}.
+    The sums and counts are added and the top streamer of each group is the top of its cells.
+    """
+    cube = cube.dropna(subset=[by])
+    columns = ["count"] + [f"{measure}_{agg}" for measure in MEASURES for agg in ("sum", "count")]
+    result = cube.groupby(by, sort=True)[columns].sum()
+    for measure in MEASURES:
+        top = cube.sort_values(f"top_{measure}", ascending=False, kind="stable").drop_duplicates(subset=[by]).set_index(by)
+        result[f"top_{measure}_name"] = top[f"top_{measure}_name"].reindex(result.index)
+        result[f"top_{measure}"] = top[f"top_{measure}"].reindex(result.index)
+    return result.reset_index()
+
+
+def head_rollup(head_cube, full_rollup, by):
+    """
+    Aggregates the cube of the first rows of the dataset {head_cube} by the dimension {by}, taking the top streamers
+    of each group from the rollup of the whole dataset {full_rollup} (the groups are those of the first rows).
+    """
+    result = rollup(head_cube, by)
+    top = full_rollup.set_index(by)
+    for measure in MEASURES:
+        for column in (f"top_{measure}_name", f"top_{measure}"):
+            result[column] = top[column].reindex(result[by]).values
+    return result
+
+
+class EDACubes:
+    """
+    Pre-aggregated data of the exploratory analysis of the dashboard: the cube of the dataset of streamers
+    (see `build_cube`) and its rollups by each dimension, so the charts read a few rows per category
+    whatever the size of the dataset. The head rollups aggregate only the first HEAD_ROWS rows of the dataset
+    (see `head_rollup`).
+
+    Parameters
+    ----------
+    cube : pd.DataFrame
+        The cube of the dataset.
+    rollups : dict
+        The rollup of the cube by each dimension in ROLLUPS.
+    head_rollups : dict
+        The rollup of the cube of the first rows by each dimension in ROLLUPS.
+    """
+
+    def __init__(self, cube, rollups, head_rollups):
+        self.cube = cube
+        self.rollups = rollups
+        self.head_rollups = head_rollups
+
+    @classmethod
+    def from_df(cls, df, head_rows=HEAD_ROWS):
+        cube = build_cube(df)
+        rollups = {by: rollup(cube, by) for by in ROLLUPS}
+        head_cube = build_cube(df.head(head_rows))
+        return cls(cube, rollups, {by: head_rollup(head_cube, rollups[by], by) for by in ROLLUPS})
+
+    def by(self, dimension, head=False):
+        return (self.head_rollups if head else self.rollups)[dimension]
+
+    def save(self, path, version=None):
+        os.makedirs(path, exist_ok=True)
+        self.cube.to_feather(os.path.join(path, "cube.feather"))
+        for by, df in self.rollups.items():
+            df.to_feather(os.path.join(path, f"by_{by}.feather"))
+        for by, df in self.head_rollups.items():
+            df.to_feather(os.path.join(path, f"head_by_{by}.feather"))
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"version": version, "head_rows": HEAD_ROWS}, f)
+
+    @classmethod
+    def load(cls, path):
+        return cls(pd.read_feather(os.path.join(path, "cube.feather")),
+            {by: pd.read_feather(os.path.join(path, f"by_{by}.feather")) for by in ROLLUPS},
+            {by: pd.read_feather(os.path.join(path, f"head_by_{by}.feather")) for by in ROLLUPS})
+
+
+def get_cubes_path(dataset_path):
+    """
+    Returns the directory where the cubes of the dataset at {dataset_path} are stored (e.g. data/streamers_small.eda).
+    """
+    return os.path.splitext(dataset_path.rstrip("/"))[0] + ".eda"
+
+
+def get_saved_version(cubes_path):
+    """
+    Returns the version of the dataset the cubes saved in {cubes_path} were built from, or None
+    (also if their head rollups are not of the first HEAD_ROWS rows).
+    """
+    meta_file = os.path.join(cubes_path, "meta.json")
+    files = [meta_file, os.path.join(cubes_path, "cube.feather")] + \
+        [os.path.join(cubes_path, f"{prefix}by_{by}.feather") for prefix in ("", "head_") for by in ROLLUPS]
+    if not all(os.path.exists(f) for f in files):
+        return None
+    with open(meta_file) as f:
+        meta = json.load(f)
+    return meta.get("version") if meta.get("head_rows") == HEAD_ROWS else None
+
+
+def build_eda_cubes(dataset_path):
+    """
+    Builds the EDACubes of the dataset at {dataset_path} and saves them next to it.
+    """
+    logger.info(f"Building the cubes of the exploratory analysis of {dataset_path}...")
+    version = dataset_version(dataset_path)
+    df = read_dataset(dataset_path, columns=["name", "last_game_played_name", "broadcaster_type", "created_at"] + MEASURES)
+    cubes = EDACubes.from_df(df)
+    cubes.save(get_cubes_path(dataset_path), version=version)
+    return cubes
+
+
+def load_eda_cubes(dataset_path):
+    """
+    Returns the EDACubes of the dataset at {dataset_path}. They are built offline (python -m src.app.eda_cubes),
+    or the first time they are needed, and again only when the dataset changes. They are loaded once per process.
+    """
+    version = dataset_version(dataset_path)
+    cubes = _loaded_cubes.get(dataset_path)
+    if cubes is not None and cubes[0] == version:
+        return cubes[1]
+    cubes_path = get_cubes_path(dataset_path)
+    if get_saved_version(cubes_path) != version:
+        cubes = build_eda_cubes(dataset_path)
+    else:
+        cubes = EDACubes.load(cubes_path)
+    _loaded_cubes[dataset_path] = (version, cubes)
+    return cubes
+
+
+@click.command()
+@click.option("--data_path", type=click.Path(exists=True), default="data/streamers_small.feather",
+    help="The dataset of the exploratory analysis (the one loaded by the dashboard)")
+def main(data_path=None):
+    """
+    Build the cubes of the exploratory analysis of the dashboard:
+
+    python -m src.app.eda_cubes --data_path data/streamers_small.feather
+    """
+    build_eda_cubes(data_path)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s.%(funcName)s - %(levelname)s: %(message)s',
+        datefmt='%b %d %H:%M',
+        level=logging.INFO
+    )
+    main()
@@ -0,0 +1,200 @@
+import os, hashlib, logging, tempfile, threading
+from collections import OrderedDict
+import click
+
+from ..data.storage import read_dataset, dataset_version
+from ..graph_utils import get_k_common_followers, get_top_followers, from_pandas_to_pyviz_net
+
+logger = logging.getLogger(os.path.basename(__name__).split(".")[-1])
+
+# Views of the ego network of a streamer shown in the dashboard
+VIEWS = ["top_followers", "common_follows"]
+
+# Part of the keys of the cache: increase it when the way the graphs are rendered changes
+RENDER_VERSION = 2
+
+
+class HTMLCache:
+    """
+    Content-addressed cache of the HTML of the network graphs shown in the dashboard.
+
+    Every entry is stored in {directory}/{key}.html, where the key is a hash of what the graph depends on
+    (the streamer, the view, its parameter and the version of the dataset), so graphs of different datasets
+    never collide and the files are never rewritten in place (they are written to a temporary file and then
+    renamed). The most recently used entries are also kept in memory and the least recently used files are
+    deleted when there are more than {max_entries}. It is thread-safe, so it can be shared by all the sessions.
+
+    Parameters
+    ----------
+    directory : str
+        The directory where the HTML files are stored.
+    max_entries : int
+        The maximum number of graphs kept on disk.
+    max_memory_entries : int
+        The maximum number of graphs kept in memory.
+    """
+
+    def __init__(self, directory="reports/.html_cache", max_entries=1024, max_memory_entries=128):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_memory_entries = max_memory_entries
+        os.makedirs(directory, exist_ok=True)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(streamer, view, k, version):
+        return hashlib.sha256(f"{streamer}|{view}|{k}|{version}|{RENDER_VERSION}".encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.html")
+
+    def get(self, key):
+        """
+        Returns the HTML stored with {key} or None if it is not in the cache.
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                html = f.read()
+            # The modification time of the files is their last use
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        self._remember(key, html)
+        return html
+
+    def set(self, key, html):
+        """
+        Stores {html} with {key} and evicts the least recently used entries if the cache is full.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(html)
+        os.replace(tmp_path, self._path(key))
+        self._remember(key, html)
+        self.evict()
+
+    def _remember(self, key, html):
+        with self._lock:
+            self._memory[key] = html
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def evict(self):
+        """
+        Deletes the least recently used files until there are at most {max_entries}.
+        """
+        files = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".html")]
+        if len(files) <= self.max_entries:
+            return
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in files[:len(files) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def get_or_render(self, streamer, view, k, version, render):
+        """
+        Returns the HTML of the graph identified by ({streamer}, {view}, {k}, {version}),
+        calling `render()` to generate it only if it is not in the cache.
+        """
+        key = self.make_key(streamer, view, k, version)
+        html = self.get(key)
+        if html is None:
+            html = render()
+            self.set(key, html)
+        return html
+
+
+def network_to_html(net):
+    """
+    Returns the HTML of a pyvis network without writing it to a file.
+    """
+    return net.generate_html(notebook=True)
+
+
+def render_ego_network(streamer, view, k, df_or_filename):
+    """
+    Returns the HTML of the graph of the given {view} of the ego network of {streamer}:
+    "top_followers" (the graph among its first {k} follows, see `get_top_followers`) or
+    "common_follows" (its follows with a co-follow weight greater than {k}, see `get_k_common_followers`).
+    """
+    if view == "top_followers":
+        df_edges = get_top_followers(df_or_filename, k=k, common_followers_with=streamer)
+    elif view == "common_follows":
+        df_edges = get_k_common_followers(df_or_filename, filter_weight=k, common_followers_with=streamer)
+    else:
+        raise ValueError(f"Unknown view {view}. Use one of {VIEWS}")
+    return network_to_html(from_pandas_to_pyviz_net(df_edges, emphasize_node=streamer))
+
+
+def get_ego_network_html(cache, streamer, view, k, dataset_path, df=None):
+    """
+    Returns the HTML of the graph of the {view} of the ego network of {streamer} in the dataset at {dataset_path}
+    from the HTMLCache {cache}, rendering it if needed. If {df} is given, it is used instead of reading the dataset.
+    """
+    return cache.get_or_render(streamer, view, k, dataset_version(dataset_path),
+        lambda: render_ego_network(streamer, view, k, dataset_path if df is None else df))
+
+
+def prerender_top_streamers(cache, views, top_n=100):
+    """
+    Renders (offline) the graphs of the given {views} of the {top_n} streamers with the most followers
+    so that the dashboard serves them from the cache.
+
+    Parameters
+    ----------
+    cache : HTMLCache
+        The cache the graphs are stored in.
+    views : dict
+        The parameter k and the dataset of each view to render, as {view: (k, dataset_path)}. They must be the same
+        the dashboard uses, otherwise the keys of the graphs will not match.
+    top_n : int
+        The number of streamers to render (those with the most followers in the dataset of the first view).
+    """
+    datasets = {path: read_dataset(path) for _, path in views.values()}
+    df = datasets[next(iter(views.values()))[1]]
+    names = df.dropna(subset=["user_follows"]).sort_values("num_followers", ascending=False)["name"].head(top_n)
+    for i, name in enumerate(names):
+        for view, (k, path) in views.items():
+            try:
+                # The graphs of top followers are made from the dataframe and those of common follows from the file
+                df_view = datasets[path] if view == "top_followers" else None
+                get_ego_network_html(cache, name, view, k, path, df=df_view)
+            except Exception as e:
+                logger.error(f"Error while rendering the {view} graph of {name}. Error: {e}")
+        if (i + 1) % 10 == 0:
+            logger.info(f"{i+1}/{len(names)} streamers have been rendered.")
+
+
+@click.command()
+@click.option("-n", "--top_n", type=int, default=100, help="The number of streamers (with the most followers) to render")
+@click.option("-d", "--directory", type=click.Path(), default="reports/.html_cache", help="The directory of the cache")
+@click.option("--data_path", type=click.Path(exists=True), default="data/streamers_small.feather",
+    help="The dataset of the graphs of top followers (the one loaded by the dashboard)")
+@click.option("--graph_data_path", type=click.Path(exists=True), default="data/streamers.feather",
+    help="The dataset of the graphs of common follows")
+def main(top_n=100, directory=None, data_path=None, graph_data_path=None):
+    """
+    Pre-render the graphs of the dashboard for the top streamers:
+
+    python -m src.app.html_cache --top_n 100
+    """
+    cache = HTMLCache(directory)
+    prerender_top_streamers(cache, {"top_followers": (15, data_path), "common_follows": (0.05, graph_data_path)}, top_n)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s.%(funcName)s - %(levelname)s: %(message)s',
+        datefmt='%b %d %H:%M',
+        level=logging.INFO
+    )
+    main()
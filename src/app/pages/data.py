@@ -1,6 +1,6 @@
 import streamlit as st
 from ..constants import *
-import pandas as pd
+from ..data_service import load_streamers_data
 import matplotlib.pyplot as plt
 import numpy as np
 
@@ -11,14 +11,16 @@ def set_data(df):
 
     menu_items = ["The Dataset", "The Users"]
     menu_variables= st.radio("",menu_items)
-    df_small = df.head(500)
+    rows = list(range(min(500, len(df))))
     # Check if user davimenxpro is in the dataset
-    if 'davimenxpro' in df['name'].str.lower().values:
+    davimenxpro_rows = np.flatnonzero((df['name'].str.lower() == 'davimenxpro').to_numpy())
+    if len(davimenxpro_rows):
         # remove last row if davimenxpro is in the dataset and add a new row with the davimenxpro data
-        df_small = df_small.drop(df_small.tail(1).index)
-        df_small = pd.concat([df_small, df[df['name'].str.lower() == 'davimenxpro'].iloc[0].to_frame().T], ignore_index=True)
-    df_small = df_small.reset_index(drop=True)
+        rows = rows[:-1] + [davimenxpro_rows[0]]
+    data = load_streamers_data(data_path)
     if menu_items.index(menu_variables) == 0:
+        # The descriptions and follows are only loaded for the rows shown
+        df_small = data.frame(data.columns, rows=rows)
         st.markdown('## The `streamers` Dataset: ')
         st.markdown('We scraped information about thousands of Twitch streamers in the Hispanic community using the Twitch API '\
         'in order to construct a dataset that would enable us to conduct our analysis. Here\'s how that dataset looks like:')
@@ -32,12 +34,10 @@ def set_data(df):
     else:
         # Select number of users to show
         col_n_user, col_sort = st.columns(2)
-        n_users = col_n_user.slider('Number of users to show',max_value=len(df_small), step=4,value=100,min_value=0)
+        n_users = col_n_user.slider('Number of users to show',max_value=len(rows), step=4,value=100,min_value=0)
         sort_by = col_sort.selectbox('Sort by', ['name', 'num_followers', 'view_count', 'created_at'],index=2)
-        if sort_by in ['created_at',"name"]:
-            top_streamers = df_small.sort_values(sort_by, ascending=True).head(n_users).copy()
-        else:
-            top_streamers = df_small.sort_values(sort_by, ascending=False).head(n_users).copy()
+        # The rows shown in the precomputed order of the dataset by sort_by (ascending for created_at and name)
+        top_streamers = data.frame(["name", "profile_image_url"], rows=data.sorted_rows(sort_by, rows=rows, n=n_users))
         
         for i in range(len(top_streamers)//4):
             col1, col2, col3, col4 = st.columns(4)
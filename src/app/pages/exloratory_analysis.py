@@ -3,6 +3,8 @@ import pandas as pd
 
 import streamlit as st
 from ..constants import *
+from ..eda_cubes import load_eda_cubes
+from ..data_service import load_streamers_data
 
 import plotly.express as px
 import plotly.io as pio
@@ -18,10 +20,13 @@ labels_dict = {
 def set_analysis(df):
 
     st.title('Exploratory Data Analysis of the Twitch `streamers` Dataset')
+    # Aggregations of the dataset precomputed by python -m src.app.eda_cubes
+    cubes = load_eda_cubes(data_path)
 
     col1, _, _, _ = st.columns(4)
     top_n = col1.slider('Top N Streamers',5,500,5)
-    fig1, fig2 = get_top_streamers_fig_by(df,by="num_followers",top_n=top_n), get_top_streamers_fig_by(df,by="view_count",top_n=top_n)
+    data = load_streamers_data(data_path)
+    fig1, fig2 = get_top_streamers_fig_by(data,by="num_followers",top_n=top_n), get_top_streamers_fig_by(data,by="view_count",top_n=top_n)
     col1,col2 = st.columns(2)
     col1.plotly_chart(fig1)
     col2.plotly_chart(fig2)
@@ -29,12 +34,12 @@ def set_analysis(df):
     col1, col2 = st.columns(2)
     bar_of = col1.selectbox("Barplot Of",["view_count","num_followers"])
     bar_by = col2.selectbox("Barplot By",["last_game_played_name","broadcaster_type"])
-    barplot = get_barplot_of_by_fig(df,bar_of,bar_by)
+    barplot = get_barplot_of_by_fig(cubes,bar_of,bar_by)
     st.plotly_chart(barplot,use_container_width=True)
 
     col1,col2 = st.columns(2)
     col1.plotly_chart(get_scatter_plotly(df),use_container_width=True)
-    col2.plotly_chart(get_joins_overtime_plot(df),use_container_width=True)
+    col2.plotly_chart(get_joins_overtime_plot(cubes),use_container_width=True)
 
 
 @st.cache_data(show_spinner=False)
@@ -68,9 +73,10 @@ def get_scatter_plotly(df):
 
     return fig
 
-def get_top_streamers_fig_by(df,by,top_n=20):
-    # top n stremers with most follows
-    df = df.copy().sort_values(by,ascending=False).head(top_n).sort_values("num_followers")
+def get_top_streamers_fig_by(data,by,top_n=20):
+    # top n stremers with most follows (the first rows of the precomputed order of the StreamersData by the column)
+    columns = ["name","num_followers"] + ([by] if by != "num_followers" else [])
+    df = data.frame(columns, rows=data.sorted_rows(by, n=top_n)).sort_values("num_followers")
 
     fig = px.bar(
         df,x="name",y=by,
@@ -86,27 +92,24 @@ def get_top_streamers_fig_by(df,by,top_n=20):
     return fig
 
 
-def get_barplot_of_by_fig(df,bar_of,bar_by,n_max=5000):
+def get_barplot_of_by_fig(cubes,bar_of,bar_by):
     """
-    barplot of bar_of by bar_by
+    barplot of bar_of by bar_by over the first HEAD_ROWS streamers of the dataset, read from the head rollup
+    of the EDACubes by bar_by (the top streamer of each category is that of the whole dataset)
     """
-    df_ = df.copy()
+    df_ = cubes.by(bar_by,head=True).rename(columns={f"top_{bar_of}_name":"Top Streamer"})
 
     if bar_by in ["last_game_played_name","view_count","num_followers"]:
-        df_ = df_.head(n_max).groupby(bar_by).count().reset_index().rename(columns={bar_of:"Count"})
+        df_ = df_.rename(columns={f"{bar_of}_count":"Count"})
         title = f"Count of Streamers by {labels_dict[bar_by]}"
         df_ = df_[df_["Count"]>5]
         ishist = True
     else:
-        df_ = df_.head(n_max).groupby(bar_by).sum().reset_index()
+        df_ = df_.rename(columns={f"{bar_of}_sum":bar_of})
         title=f"{labels_dict.get(bar_of)} by {labels_dict.get(bar_by)}"
         ishist = False
 
     y_label = bar_of if not ishist else "Count"
-    for row in df_.iloc:
-        cat = row[bar_by]
-        top_streamer_in_category = df[df[bar_by]==cat].sort_values(bar_of,ascending=False).iloc[0]['name']
-        df_.loc[df_[bar_by]==cat,'Top Streamer'] = top_streamer_in_category
 
     fig = px.bar(
         df_,
@@ -124,13 +127,9 @@ def get_barplot_of_by_fig(df,bar_of,bar_by,n_max=5000):
     )
     return fig
 
-def get_joins_overtime_plot(df):
-    df = df.copy().assign(
-        month=lambda x: x.created_at.dt.strftime("%Y-%m")
-    )
-    df["count"] = 1
-    # agg by month
-    df = df[['count', 'month']].groupby('month').sum().reset_index()
+def get_joins_overtime_plot(cubes):
+    # streamers that joined each month (rollup of the cube by month)
+    df = cubes.by("month")[["month","count"]].copy()
     df["cumulative_growth"] = df['count'].cumsum()
 
     fig = px.bar(
@@ -7,11 +7,12 @@ import plotly.express as px
 import plotly.io as pio
 import os
 import base64
-import pickle
 import collections
 
 from ..constants import *
-from ...graph_utils import get_k_common_followers, get_top_followers, from_pandas_to_pyviz_net
+from ..html_cache import HTMLCache, get_ego_network_html
+from ..data_service import load_streamers_data
+from ...metrics.rank_table import load_rank_table
 
 pio.templates.default = "plotly_dark"
 
@@ -49,17 +50,17 @@ def set_graph_analysis(df):
         # st.text("Sorry, this feature is not implemented yet")
         show_gephi_graphs()
 
-def pv_static(fig, name='graph'):
+def pv_static(html, height=600, width=600):
     # https://github.com/napoles-uach/stvis
-    h1 = fig.height
-    h1 = int(h1.replace('px', ''))
-    w1 = fig.width
-    w1 = int(w1.replace('px', ''))
-    fig.show(name+'.html')
     return components.html(
-        fig.html, height=h1+30, width=w1+30
+        html, height=height+30, width=width+30
     )
 
+@st.cache_resource(show_spinner=False)
+def get_html_cache():
+    # Shared by all the sessions of the dashboard
+    return HTMLCache("reports/.html_cache")
+
 def show_streamers_pyviz_graphs(df):
     
     st.subheader("How do streamers follow each other?")
@@ -78,17 +79,16 @@ def show_streamers_pyviz_graphs(df):
     col2.subheader('Graph of User Follows')
     col2.markdown(explanations_of_graph_2)
     col1, _, col2 = st.columns( (0.45,.1,0.45) )
+    html_cache = get_html_cache()
     with col1:
-        df1 = get_top_followers(
-            df.copy(), common_followers_with=selected_streamer)
-        net1 = from_pandas_to_pyviz_net(df1, emphasize_node=selected_streamer)
-        pv_static(net1, name="reports/graph")
+        # The follows are only loaded (once per process) by the pages that need them
+        df_follows = load_streamers_data(data_path).frame(["id", "name", "user_follows"])
+        html1 = get_ego_network_html(html_cache, selected_streamer, "top_followers", 15, data_path, df=df_follows)
+        pv_static(html1)
 
     with col2:
-        df2 = get_k_common_followers(
-            "data/streamers.feather", common_followers_with=selected_streamer)
-        net2 = from_pandas_to_pyviz_net(df2, emphasize_node=selected_streamer)
-        pv_static(net2, name="reports/graph2")
+        html2 = get_ego_network_html(html_cache, selected_streamer, "common_follows", 0.05, graph_data_path)
+        pv_static(html2)
 
     
 
@@ -143,29 +143,18 @@ def show_gephi_graphs():
 
 @st.cache_data(show_spinner=False)
 def get_df_metrics(df):
+    rank_table = load_rank_table("data/fundamental_metrics")
+    names = df.drop_duplicates("id").set_index("id")["name"]
     df_ranking_metrics = pd.DataFrame()
     for m in ["indegree","outdegree", "closeness", "betweenness", "pagerank", "nx_cores"]:
-        # load metric
-        folder_name = "data/fundamental_metrics"
-        file_name = f"{folder_name}/{m}.pkl"
-        with open(file_name, 'rb') as f:
-            metric = pickle.load(f)
-        ranking10_ids = list(metric.keys())[:10]
-        ranking10_names = [df[df["id"]==node_id]["name"].iloc[0] for node_id in ranking10_ids]
-        df_ranking_metrics[m] = ranking10_names
+        df_ranking_metrics[m] = names.reindex(rank_table.top_k(m, 10)).values
     return df_ranking_metrics
 
 @st.cache_data(show_spinner=False)
 def get_pie_cores_topusers(df):
     df_ranking_metrics = get_df_metrics(df)
     # load k-core descomposition
-    with open("data/fundamental_metrics/nx_cores.pkl", 'rb') as f:
-        nx_cores = pickle.load(f)
-    
-    # reformat NetworkX solution
-    nx_cores_format = {c:set() for c in set(nx_cores.values())}
-    for node in nx_cores:
-      nx_cores_format[nx_cores[node]].add(node)
+    rank_table = load_rank_table("data/fundamental_metrics")
 
     # order the imporant users (according to fundamental metrics) by core number
     important_users_names = collections.Counter()
@@ -178,7 +167,10 @@ def get_pie_cores_topusers(df):
     # extract ids from important users
     important_users_ids = list(df[df["name"].isin(important_users_names)]["id"])
 
-    important_users_cores = { user_id: nx_cores[user_id] for user_id in important_users_ids}
+    # Users missing from the rank table (NaN) are left out
+    important_users_cores = {user_id: int(core) for user_id, core in
+        zip(important_users_ids, rank_table.values("nx_cores", important_users_ids).tolist()) if pd.notnull(core)}
+    important_users_ids = list(important_users_cores)
     # reformat NetworkX solution
     important_users_cores_format = {c:set() for c in set(important_users_cores.values())}
     for node in important_users_cores:
@@ -202,16 +194,9 @@ def get_pie_cores_topusers(df):
     )
     return fig
 
-@st.cache_data(show_spinner=False)
 def get_metrics_streamer(streamer_name, df):
-    streamer_id = str(int(df.loc[df["name"]==streamer_name]["id"]))
-    df_position_metrics = pd.DataFrame()
-    for m in ["indegree","outdegree", "closeness", "betweenness", "pagerank", "nx_cores"]:
-        # load metric
-        with open(f"data/fundamental_metrics/{m}.pkl", 'rb') as f:
-            metric = pickle.load(f)
-        position = list(metric.keys()).index(streamer_id)
-        df_position_metrics[m] = [position+1,]
+    streamer_id = int(df.loc[df["name"]==streamer_name]["id"].iloc[0])
+    positions = load_rank_table("data/fundamental_metrics").ranks(streamer_id)
+    df_position_metrics = pd.DataFrame({m: [positions[m],] for m in ["indegree","outdegree", "closeness", "betweenness", "pagerank", "nx_cores"]})
     df_position_metrics.index = [streamer_name,]
     return df_position_metrics
-        
@@ -0,0 +1,149 @@
+import os, json, logging
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from .data.storage import read_dataset, dataset_version
+from .graph_index import GraphIndex, load_graph_index, get_index_path
+
+logger = logging.getLogger(os.path.basename(__name__).split(".")[-1])
+
+# Arrays of a CoFollowIndex stored in the directory of the graph index (one .npy file each)
+COFOLLOW_ARRAYS = ["indptr", "indices", "weights"]
+
+# Co-follow indexes already loaded by this process, by the path of their dataset
+_loaded_indexes = {}
+
+
+class CoFollowIndex:
+    """
+    Precomputed co-follow weights between every streamer and the streamers it follows.
+
+    For a streamer u whose follows (with known follows themselves) are F, the weight of each
+    streamer i in F is |F ∩ follows(i)| / |F|: how many of the streamers followed by u are also
+    followed by i. The weights of all the streamers are computed at once from the sparse product
+    of the adjacency matrix with its transpose (masked by the adjacency matrix itself) and
+    stored as CSR arrays with the follows of each streamer sorted by descending weight, so the
+    top k of a streamer is a slice of the arrays. Only positive weights are stored.
+
+    Parameters
+    ----------
+    names : np.ndarray
+        The names of the streamers (one per node of the graph index).
+    indptr, indices, weights : np.ndarray
+        The CSR arrays of the weights, sorted by descending weight within each row.
+    """
+
+    def __init__(self, names, indptr, indices, weights):
+        self.names = np.asarray(names, dtype=object)
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        # Lowercase name -> node (the first one if a name is repeated)
+        lower_names = pd.Series(self.names).str.lower()
+        self._nodes_by_name = dict(zip(lower_names[~lower_names.duplicated()], np.flatnonzero(~lower_names.duplicated())))
+
+    @classmethod
+    def from_graph(cls, graph, names, block_size=2048):
+        """
+        Computes the weights of the GraphIndex {graph} processing {block_size} streamers at a time.
+        """
+        n = graph.n_nodes
+        A = graph.to_scipy()
+        # Only the follows whose own follows are known count
+        A = (A @ sp.diags(np.asarray(graph.has_follows, dtype=np.float64))).tocsr()
+        A.eliminate_zeros()
+        AT = A.T.tocsr()
+        n_follows = np.diff(A.indptr)
+        blocks = []
+        for start in range(0, n, block_size):
+            block = A[start:start + block_size]
+            # counts[u, i] = |follows(u) ∩ follows(i)| for every i followed by u
+            blocks.append((block @ AT).multiply(block).tocsr())
+        counts = sp.vstack(blocks, format="csr") if blocks else sp.csr_matrix((n, n))
+        counts.eliminate_zeros()
+        rows = np.repeat(np.arange(n), np.diff(counts.indptr))
+        weights = counts.data / n_follows[rows]
+        # Sort each row by descending weight (and by node to break ties)
+        order = np.lexsort((counts.indices, -weights, rows))
+        return cls(names, counts.indptr.astype(np.int64), counts.indices[order].astype(np.int32), weights[order])
+
+    @classmethod
+    def from_df(cls, df):
+        """
+        Computes the weights of a dataframe of streamers with the columns id, name and user_follows.
+        """
+        graph = GraphIndex.from_df(df)
+        # The ids may be strings (datasets of previous versions of the pipeline)
+        df = df.assign(id=pd.to_numeric(df["id"]).astype("int64"))
+        names = df.drop_duplicates(subset=["id"]).set_index("id")["name"].reindex(graph.ids).values
+        return cls.from_graph(graph, names)
+
+    def node_of(self, name):
+        """
+        Returns the node of the streamer with the given name (case insensitive).
+        """
+        node = self._nodes_by_name.get(name.lower())
+        if node is None:
+            raise ValueError(f"There is no streamer named {name} in the dataset")
+        return node
+
+    def top_k(self, name, k=None, min_weight=None):
+        """
+        Returns the nodes followed by the streamer with the given name and their weights, sorted by
+        descending weight: the {k} first ones or, if {min_weight} is given, those with a greater weight.
+        """
+        node = self.node_of(name)
+        start, end = self.indptr[node], self.indptr[node + 1]
+        weights = self.weights[start:end]
+        if min_weight is not None:
+            # The weights are sorted in descending order
+            end = start + np.searchsorted(-weights, -min_weight, side="left")
+        if k is not None:
+            end = min(end, start + k)
+        return self.indices[start:end], self.weights[start:end]
+
+    def save(self, path, version=None):
+        os.makedirs(path, exist_ok=True)
+        for name in COFOLLOW_ARRAYS:
+            np.save(os.path.join(path, f"cofollow_{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, "cofollow.json"), "w") as f:
+            json.dump({"version": version}, f)
+
+    @classmethod
+    def load(cls, path, names, mmap_mode="r"):
+        return cls(names, *[np.load(os.path.join(path, f"cofollow_{name}.npy"), mmap_mode=mmap_mode) for name in COFOLLOW_ARRAYS])
+
+
+def get_saved_version(index_path):
+    """
+    Returns the version of the dataset the co-follow weights saved in {index_path} were computed from, or None.
+    """
+    meta_file = os.path.join(index_path, "cofollow.json")
+    files = [meta_file] + [os.path.join(index_path, f"cofollow_{name}.npy") for name in COFOLLOW_ARRAYS]
+    if not all(os.path.exists(f) for f in files):
+        return None
+    with open(meta_file) as f:
+        return json.load(f).get("version")
+
+
+def load_cofollow_index(dataset_path):
+    """
+    Returns the CoFollowIndex of the dataset of streamers at {dataset_path}. The weights are stored
+    (memory-mapped) next to its graph index and only computed again when the dataset changes.
+    The index is loaded once per process.
+    """
+    version = dataset_version(dataset_path)
+    index = _loaded_indexes.get(dataset_path)
+    if index is not None and index[0] == version:
+        return index[1]
+    graph = load_graph_index(dataset_path)
+    names = read_dataset(dataset_path, columns=["id", "name"]).drop_duplicates(subset=["id"])
+    names = names.set_index("id")["name"].reindex(np.asarray(graph.ids)).values
+    index_path = get_index_path(dataset_path)
+    if get_saved_version(index_path) != version:
+        logger.info(f"Computing the co-follow weights of {dataset_path}...")
+        CoFollowIndex.from_graph(graph, names).save(index_path, version=version)
+    index = CoFollowIndex.load(index_path, names)
+    _loaded_indexes[dataset_path] = (version, index)
+    return index
@@ -1,2 +1,5 @@
 from .make_dataset import make_data_from_root_user
-from .make_dataset import extract_follows_from_users_df, extract_num_followers_from_users_df
\ No newline at end of file
+from .async_crawl import make_data_from_root_user_async
+from .make_dataset import extract_follows_from_users_df, extract_num_followers_from_users_df
+from .storage import read_dataset, write_dataset
+from .refresh import refresh_dataset, EdgeDeltaLog
@@ -1,5 +1,9 @@
 from logging import root
-from .make_dataset import make_dataset, extract_follows_from_users_df, extract_num_followers_from_users_df
+from .make_dataset import make_dataset, get_journal, extract_follows_from_users_df, extract_num_followers_from_users_df
+from .refresh import refresh_dataset, REFRESH_TTL
+from ..twitch_utils import set_default_cache
+from ..twitch_cache import DAY
+from ..user import User
 import logging, os
 import click
 
@@ -18,12 +22,17 @@ Extract the data required to carry the analysis of hispanic twitch streamers
 Usage: 
 ----------
 ```
-python -m src.data --root_user "ibai" --output_file "data/data.csv" --max_users 10000 --get_follows_of_top 1000 --get_num_followers_of_top 1000
+python -m src.data --root_user "ibai" --output_file "data/streamers.parquet" --max_users 10000 --get_follows_of_top 1000 --get_num_followers_of_top 1000
+python -m src.data --root_user "ibai" --output_file "data/streamers.parquet" --max_users 10000 --engine async --concurrency 32
+python -m src.data --root_user "ibai" --output_file "data/streamers.parquet" --max_users 10000 --resume
+python -m src.data --input_df "data/streamers.parquet" --refresh
 ```
 """
 
 @click.command()
-@click.option("-o",'--output_file', type=click.Path(),default="data/data.csv",required=False,help="Output (csv) file path")
+@click.option("-o",'--output_file', type=click.Path(),default=None,required=False,
+    help="Output file path (data/streamers.parquet by default, or the input_df with --refresh). "\
+        "Its extension sets the format of the dataset: a .parquet dataset partitioned by broadcaster_type, a .feather file or a .csv file")
 @click.option('-r', '--root_user', is_flag=False, default="ibai", help="The root user to start the crawl from")
 @click.option('-n', '--max_users', is_flag=False, default=20000, help="Maximum number of users to grow the tree for")
 @click.option("-in",'--input_df', type=click.Path(),required=False, default=None,
@@ -31,18 +40,50 @@ python -m src.data --root_user "ibai" --output_file "data/data.csv" --max_users
         "according to @get_follows_of_top and @get_num_followers_of_top")
 @click.option('-fot', '--get_follows_of_top', default=0, type=int,help="The number of top users to get the follows of by view count")
 @click.option('-nfot', '--get_num_followers_of_top', default=0, type=int, help="The number of top users to get the number of followers of by view count")
-def main(output_file=None,input_df=None,root_user=None,max_users=None,get_follows_of_top=None,get_num_followers_of_top=None):
+@click.option('-e', '--engine', type=click.Choice(["sync", "async"]), default="sync", help="Expand the tree one user at a time (sync) or many users at the same time (async)")
+@click.option('-c', '--concurrency', default=32, type=int, help="The maximum number of requests in flight at the same time (with --engine async and when extracting the follows or number of followers)")
+@click.option('--resume', is_flag=True, default=False, help="Resume a crawl that was stopped from its checkpoint journal instead of starting from scratch")
+@click.option('-j', '--journal_file', type=click.Path(), default=None, help="Path of the checkpoint journal (defaults to {output_file}.journal)")
+@click.option('-f', '--frontier', type=click.Choice(["random", "priority"]), default="random",
+    help="Expand the users of the tree in random order or those with the highest view count first (priority)")
+@click.option('--cache/--no-cache', default=True,
+    help="Read the responses of the Twitch API that are still fresh from the local cache (TWITCH_API_CACHE) instead of fetching them again")
+@click.option('--refresh', is_flag=True, default=False,
+    help="Fetch again only the profiles, follows and number of followers of the users of input_df that are older than their time to live")
+@click.option('--max_age', type=float, default=None,
+    help=f"With --refresh, the maximum age (in days) of the data of the users. Defaults to { {kind: ttl/DAY for kind, ttl in REFRESH_TTL.items()} }")
+@click.option('--delta_log', type=click.Path(), default=None,
+    help="With --refresh, the path of the log of the changes of the follows (defaults to {output_file} with the extension .deltas.jsonl)")
+def main(output_file=None,input_df=None,root_user=None,max_users=None,get_follows_of_top=None,get_num_followers_of_top=None,engine=None,concurrency=None,
+        resume=False,journal_file=None,frontier=None,cache=True,refresh=False,max_age=None,delta_log=None):
+    if not cache:
+        set_default_cache(False)
+    if input_df:
+        # The follows of the users are read from the dataset instead of fetched again
+        User.use_follows_dataset(input_df)
+    if refresh:
+        if not input_df:
+            raise ValueError("The dataset to refresh (input_df) must be specified with --refresh")
+        ttl = {kind: max_age*DAY for kind in REFRESH_TTL} if max_age is not None else None
+        refresh_dataset(input_df,output_file=output_file or input_df,ttl=ttl,delta_log=delta_log,concurrency=concurrency)
+        return
+    output_file = output_file or "data/streamers.parquet"
     if not input_df:
-        make_dataset(root_user,output_file=output_file,max_users=max_users,get_follows_of_top=get_follows_of_top,get_num_followers_of_top=get_num_followers_of_top)
+        make_dataset(root_user,output_file=output_file,max_users=max_users,get_follows_of_top=get_follows_of_top,get_num_followers_of_top=get_num_followers_of_top,
+            engine=engine,concurrency=concurrency,resume=resume,journal_file=journal_file,frontier=frontier)
     else:
         if root_user or max_users:
             logger.warning("The root_user and max_users options are not compatible when the dataset has already been created (input_df). root_user and max_users will be ignored")
+        if not get_follows_of_top and not get_num_followers_of_top:
+            raise ValueError("Either get_follows_of_top or get_num_followers_of_top must be specified if input_df is specified")
+        journal = get_journal(output_file,journal_file,resume)
+        df = input_df
         if get_follows_of_top:
-            extract_follows_from_users_df(input_df,output_file,get_follows_of_top)
+            only_top = None if get_follows_of_top==-1 else get_follows_of_top
+            df = extract_follows_from_users_df(df,output_file,only_top,journal=journal,resume=resume,concurrency=concurrency)
         if get_num_followers_of_top:
-            extract_num_followers_from_users_df(input_df,output_file,get_num_followers_of_top)
-        else:
-            raise ValueError("Either get_follows_of_top or get_num_followers_of_top must be specified if input_df is specified")
+            only_top = None if get_num_followers_of_top==-1 else get_num_followers_of_top
+            extract_num_followers_from_users_df(df,output_file,only_top,journal=journal,resume=resume,concurrency=concurrency)
 
 if __name__ == "__main__":  
     main()
\ No newline at end of file
@@ -0,0 +1,185 @@
+import os, logging
+import asyncio
+import pandas as pd
+
+from ..user import User
+from ..twitch_utils import AsyncTwitchClient
+from .frontier import Frontier, add_spanish_streamers
+from .storage import write_dataset
+
+logger = logging.getLogger(os.path.basename(__name__).split(".")[-1])
+
+
+async def get_user_follows_async(client, user_id):
+    """
+    Returns the list of ids of the users that the user with the given id follows.
+    Asynchronous version of `User.get_user_follows`.
+    """
+    follows = []
+    params = dict(from_id=user_id, first=100)
+    while True:
+        follows_from_resp = await client.get("users/follows", params=params)
+        follows.extend(follow["to_id"] for follow in follows_from_resp.get("data"))
+        cursor = follows_from_resp.get("pagination", dict()).get("cursor")
+        if not cursor:
+            break
+        params = dict(from_id=user_id, first=100, after=cursor)
+    return follows
+
+
+async def get_users_records_async(client, user_ids):
+    """
+    Returns a list of dicts with the data of the users with the given ids.
+    Asynchronous version of `User.get_users_records`, the batches of 100 ids are requested concurrently.
+    """
+    async def get_batch(ids):
+        resp_user, resp_channel = await asyncio.gather(
+            client.get("users", params=[("id", user_id) for user_id in ids]),
+            client.get("channels", params=[("broadcaster_id", user_id) for user_id in ids])
+        )
+        return User.records_from_api_data(resp_user["data"], resp_channel["data"])
+
+    batches = await asyncio.gather(*[get_batch(user_ids[i:i+100]) for i in range(0, len(user_ids), 100)])
+    return [record for batch in batches for record in batch]
+
+
+async def get_users_async(client, user_ids):
+    """
+    Returns a list of User objects with the data of the users with the given ids.
+    Asynchronous version of `User.get_users`.
+    """
+    return [User(**record) for record in await get_users_records_async(client, user_ids)]
+
+
+async def _crawl_from_root_user(root_user_name, frontier, max_users=None, concurrency=32, journal=None, resume=False):
+    async with AsyncTwitchClient(concurrency=concurrency) as client:
+        rng = frontier.rng
+        state = journal.load() if journal is not None and resume else None
+        if state is not None and state.users:
+            logger.info(f"Resuming the crawl from the journal {journal.path}...")
+            all_users = {user_id: User(**user) for user_id, user in state.users.items()}
+            for kind, fetched_at in state.fetched_at.items():
+                frontier.fetched_at[kind].update(fetched_at)
+            for user_id in state.visited:
+                frontier.mark_visited(all_users[user_id])
+            for user_id in state.frontier:
+                frontier.add(all_users[user_id])
+            if state.rng_state is not None:
+                rng.bit_generator.state = state.rng_state
+            if "crawl" in state.done:
+                logger.info("The crawl of the journal had already finished.")
+                return
+        else:
+            resp = await client.get("users", params=[("login", root_user_name)])
+            root_user = (await get_users_async(client, [resp["data"][0]["id"]]))[0]
+            assert root_user.lang == "es", "Only Spanish users can be fetched."
+            frontier.add(root_user)
+            if journal is not None:
+                journal.write_users([root_user])
+        in_flight = {}
+        itt = len(frontier.visited)
+
+        def n_retrieved():
+            return len(frontier) + len(frontier.visited) + len(in_flight)
+
+        async def expand(rand_user):
+            nonlocal itt
+            try:
+                rand_user.user_follows = await get_user_follows_async(client, rand_user.id)
+                new_users = await get_users_records_async(client, rand_user.user_follows)
+            except asyncio.CancelledError:
+                # The user whose expansion was interrupted goes back to the frontier
+                frontier.add(rand_user)
+                raise
+            except Exception as e:
+                logger.error(f"Error while fetching follows of user {rand_user.name} from the API. Error: {e}")
+                if journal is not None:
+                    journal.write_dropped(rand_user.id)
+                return
+            finally:
+                in_flight.pop(rand_user.id, None)
+            frontier.mark_visited(rand_user)
+            # Add only the Spanish streamers that have not been seen yet
+            added_users = add_spanish_streamers(frontier, new_users, exclude=in_flight)
+            if journal is not None:
+                journal.write_visited(rand_user, rng_state=rng.bit_generator.state)
+                journal.write_users(added_users)
+            if itt % 10 == 0:
+                logger.info(f"Iteration {itt+1}: {n_retrieved()} users have been retrieved until now.")
+            itt += 1
+
+        async def worker():
+            while max_users is None or n_retrieved() < max_users:
+                if not len(frontier):
+                    if not in_flight:
+                        return
+                    # Wait for the expansions in flight to add new users to the frontier
+                    await asyncio.sleep(0.05)
+                    continue
+                # Get the next user to expand from the frontier
+                rand_user = frontier.pop()
+                in_flight[rand_user.id] = rand_user
+                await expand(rand_user)
+
+        logger.info(f"The tree will be expanded {'randomly' if frontier.mode == 'random' else 'by view count'} "\
+            f"starting from the root with {concurrency} concurrent expansions.")
+        tasks = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+        try:
+            await asyncio.gather(*tasks)
+            logger.info(f"max_users reached at iteration {itt}. {n_retrieved()} users were retrieved.")
+            if journal is not None:
+                journal.write_done("crawl")
+        except asyncio.CancelledError:
+            logger.info(f"A total of {n_retrieved()} users were retrieved. Number of iterations: {itt}")
+
+
+def make_data_from_root_user_async(root_user_name,output_file=None,max_users=None,concurrency=32,journal=None,resume=False,frontier_mode="random"):
+    """
+    Same as `make_data_from_root_user` but expanding up to {concurrency} users of the tree at the same time
+    using asynchronous requests to the Twitch API.
+
+    Parameters
+    ----------
+    root_user_name : str
+        The name of the root user to start the tree from.
+    output_file : str
+        The path to the output file.
+    max_users : int
+        The maximum number of users to retrieve.
+    concurrency : int
+        The maximum number of requests in flight at the same time.
+    journal : CrawlJournal
+        If given, the progress of the crawl is appended to this journal after every expansion.
+    resume : bool
+        If True, the crawl is resumed from the state recorded in {journal}.
+    frontier_mode : str
+        "random" to expand the users of the tree in random order or "priority" to expand those with the highest view count first.
+
+    Returns
+    -------
+    pd.DataFrame : list
+        A list of all the users in the tree.
+    """
+    logger.info(f'Collecting users from a tree of twitch users follows starting from the follows of the user: {root_user_name}')
+    frontier = Frontier(mode=frontier_mode)
+    loop = asyncio.new_event_loop()
+    crawl = loop.create_task(_crawl_from_root_user(root_user_name, frontier, max_users=max_users, concurrency=concurrency,
+        journal=journal, resume=resume))
+    try:
+        loop.run_until_complete(crawl)
+    except KeyboardInterrupt:
+        logger.info("KeyboardInterrupt received. Stopping the program..")
+        crawl.cancel()
+        loop.run_until_complete(crawl)
+    finally:
+        loop.close()
+
+    if len(frontier)+len(frontier.visited)==0:
+        logger.info("No users were retrieved. Exiting.")
+        return pd.DataFrame()
+
+    df = frontier.users_df()
+    if output_file:
+        logger.info("writing dataset to file before stopping...")
+        write_dataset(df,output_file)
+    return df
@@ -0,0 +1,153 @@
+import os, json, logging
+from dataclasses import asdict, dataclass, field
+import pandas as pd
+
+from .storage import fetch_time
+
+logger = logging.getLogger(os.path.basename(__name__).split(".")[-1])
+
+
+@dataclass
+class CrawlState:
+    """
+    The state of a crawl reconstructed from its journal.
+    """
+    users: dict = field(default_factory=dict)
+    visited: list = field(default_factory=list)
+    dropped: set = field(default_factory=set)
+    rng_state: dict = None
+    updates: dict = field(default_factory=dict)
+    done: set = field(default_factory=set)
+    # Time the profile and the follows of each user were fetched (None if the journal did not record it)
+    fetched_at: dict = field(default_factory=lambda: {"profile": {}, "follows": {}})
+
+    @property
+    def frontier(self):
+        """
+        The ids of the users that were collected but have not been expanded yet.
+        """
+        visited = set(self.visited)
+        return [user_id for user_id in self.users if user_id not in visited and user_id not in self.dropped]
+
+
+class CrawlJournal:
+    """
+    Append-only journal (one json record per line) of the progress of a crawl.
+
+    Instead of rewriting the whole dataset every few iterations, each step of the crawl
+    appends only what changed: the new users found, the user that was expanded (with its follows),
+    the users dropped from the frontier, the state of the random generator and the fields
+    filled by the enrichment passes. `load()` replays it to resume a crawl that was killed.
+
+    Parameters
+    ----------
+    path : str
+        The path of the journal file.
+    reset : bool
+        If True, the existing journal at {path} is discarded.
+    """
+
+    def __init__(self, path, reset=False):
+        self.path = path
+        if reset and os.path.exists(path):
+            os.remove(path)
+        self._file = None
+
+    def exists(self):
+        return os.path.exists(self.path) and os.path.getsize(self.path) > 0
+
+    def _append(self, record):
+        if self._file is None:
+            self._file = open(self.path, "a")
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def write_users(self, users):
+        """
+        Records new users added to the crawl.
+        """
+        if users:
+            self._append({"type": "users", "users": [asdict(user) for user in users], "fetched_at": fetch_time()})
+
+    def write_visited(self, user, rng_state=None):
+        """
+        Records that the follows of the given user were retrieved.
+        """
+        self._append({"type": "visited", "id": user.id, "user_follows": user.user_follows, "rng_state": rng_state,
+            "fetched_at": fetch_time()})
+
+    def write_dropped(self, user_id):
+        """
+        Records that a user was removed from the frontier without being expanded.
+        """
+        self._append({"type": "dropped", "id": user_id})
+
+    def write_update(self, user_id, **fields):
+        """
+        Records the fields of a user filled by an enrichment pass (e.g. user_follows or num_followers).
+        """
+        self._append({"type": "update", "id": user_id, "fields": fields})
+
+    def write_done(self, stage):
+        """
+        Records that a stage of the pipeline (e.g. "crawl") finished.
+        """
+        self._append({"type": "done", "stage": stage})
+
+    def load(self):
+        """
+        Replays the journal and returns the CrawlState it describes.
+        """
+        state = CrawlState()
+        if not self.exists():
+            return state
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last line may be truncated if the process was killed while writing it
+                    logger.warning(f"Skipping a corrupted record of the journal {self.path}")
+                    continue
+                if record["type"] == "users":
+                    for user in record["users"]:
+                        state.users.setdefault(user["id"], user)
+                        state.fetched_at["profile"].setdefault(user["id"], record.get("fetched_at"))
+                        # A dropped user can be found again later in the crawl
+                        state.dropped.discard(user["id"])
+                elif record["type"] == "visited":
+                    state.visited.append(record["id"])
+                    state.users[record["id"]]["user_follows"] = record["user_follows"]
+                    state.fetched_at["follows"][record["id"]] = record.get("fetched_at")
+                    if record.get("rng_state") is not None:
+                        state.rng_state = record["rng_state"]
+                elif record["type"] == "dropped":
+                    state.dropped.add(record["id"])
+                elif record["type"] == "update":
+                    state.updates.setdefault(record["id"], {}).update(record["fields"])
+                elif record["type"] == "done":
+                    state.done.add(record["stage"])
+        return state
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def apply_journal_updates(df, updates):
+    """
+    Returns a copy of the dataframe of users {df} with the fields recorded in the
+    journal by the enrichment passes ({updates}, as in `CrawlState.updates`) filled in.
+    """
+    if not updates:
+        return df
+    df = df.copy()
+    ids = df["id"].astype(str)
+    fields = {name for user_fields in updates.values() for name in user_fields}
+    for name in fields:
+        values = {str(user_id): user_fields[name] for user_id, user_fields in updates.items() if name in user_fields}
+        has_update = ids.isin(values.keys())
+        previous = df[name].astype(object) if name in df.columns else pd.Series(None, index=df.index, dtype=object)
+        df[name] = previous.where(~has_update, ids.map(values))
+    return df
@@ -0,0 +1,78 @@
+import os, logging
+import asyncio
+
+from ..twitch_utils import AsyncTwitchClient
+
+logger = logging.getLogger(os.path.basename(__name__).split(".")[-1])
+
+
+async def get_num_followers_async(client, user_id):
+    """
+    Returns the number of followers of the user with the given id.
+    Asynchronous version of `User.get_num_followers_of_user`.
+    """
+    follows_resp = await client.get("users/follows", params=dict(to_id=user_id))
+    return follows_resp.get("total")
+
+
+def fetch_concurrently(fetch, user_ids, concurrency=32, on_result=None, print_every=100, description="users", cache=None):
+    """
+    Runs `await fetch(client, user_id)` for all the given user ids with at most {concurrency}
+    requests in flight (paced by the rate limiter shared by all the clients) and returns
+    a dict with the result of each user id. The users whose request fails are logged and skipped.
+    If the program is interrupted, the results obtained until then are returned.
+
+    Parameters
+    ----------
+    fetch : coroutine function
+        The function that fetches the data of a user from the API (e.g `get_num_followers_async`).
+    user_ids : list
+        The ids of the users to fetch.
+    concurrency : int
+        The maximum number of requests in flight at the same time.
+    on_result : function
+        If given, it is called with (user_id, result) as soon as the result of each user is available.
+    print_every : int
+        The progress will be logged every {print_every} users.
+    description : str
+        What is being fetched, to be shown in the logs.
+    cache : ResponseCache
+        The cache of the responses of the client (see `AsyncTwitchClient`). Use False to always fetch fresh data.
+    """
+    results = {}
+    n_users = len(user_ids)
+
+    async def run():
+        async with AsyncTwitchClient(concurrency=concurrency, cache=cache) as client:
+            pending = iter(user_ids)
+
+            async def worker():
+                # All the workers take the next user id from the same iterator
+                for user_id in pending:
+                    try:
+                        result = await fetch(client, user_id)
+                    except Exception as e:
+                        logger.error(f"Error while getting the {description} of the user with id {user_id}. Error: {e}")
+                        continue
+                    results[user_id] = result
+                    if on_result is not None:
+                        on_result(user_id, result)
+                    if len(results) % print_every == 0:
+                        logger.info(f"{len(results)}/{n_users} have been processed.")
+
+            await asyncio.gather(*[worker() for _ in range(min(concurrency, max(n_users, 1)))])
+
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(run())
+    try:
+        loop.run_until_complete(task)
+    except KeyboardInterrupt:
+        logger.info("KeyboardInterrupt received. Stopping the program..")
+        task.cancel()
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+    finally:
+        loop.close()
+    return results
@@ -0,0 +1,149 @@
+import heapq
+import itertools
+import numpy as np
+import pandas as pd
+
+from ..user import User
+from .storage import fetch_time, set_fetched_at
+
+
+class Frontier:
+    """
+    The users of a crawl that are pending to be expanded, together with an index of the users that
+    were already expanded (visited). Adding a user, checking if it was already seen and taking the next
+    user to expand are all O(1) (O(log n) in priority mode), so the cost of an iteration of the crawl
+    does not grow with the number of users retrieved.
+
+    Parameters
+    ----------
+    mode : str
+        "random" to take the next user uniformly at random or "priority" to take the user with the highest view_count.
+    rng : np.random.Generator
+        The random generator used in random mode.
+    """
+
+    def __init__(self, mode="random", rng=None):
+        if mode not in ("random", "priority"):
+            raise ValueError(f"Unknown frontier mode {mode}. Use 'random' or 'priority'")
+        self.mode = mode
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.visited = {}
+        self._pending = {}
+        # Time the profile and the follows of each user were fetched (the first time it was added or visited)
+        self.fetched_at = {"profile": {}, "follows": {}}
+        # random mode: ids in a list and their position in it to remove them by swapping with the last one
+        self._ids = []
+        self._positions = {}
+        # priority mode: heap of (-view_count, insertion order, id). Removed ids are skipped lazily
+        self._heap = []
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def __contains__(self, user_id):
+        return user_id in self._pending
+
+    def __iter__(self):
+        return iter(self._pending.values())
+
+    def seen(self, user_id):
+        """
+        Returns True if the user with the given id is pending or was already visited.
+        """
+        return user_id in self._pending or user_id in self.visited
+
+    def add(self, user):
+        """
+        Adds a user to the frontier. Returns False (and does nothing) if the user had already been seen.
+        """
+        if self.seen(user.id):
+            return False
+        self._pending[user.id] = user
+        self.fetched_at["profile"].setdefault(user.id, fetch_time())
+        if self.mode == "random":
+            self._positions[user.id] = len(self._ids)
+            self._ids.append(user.id)
+        else:
+            heapq.heappush(self._heap, (-(user.view_count or 0), next(self._counter), user.id))
+        return True
+
+    def pop(self):
+        """
+        Removes and returns the next user to expand.
+        """
+        if not self._pending:
+            raise IndexError("pop from an empty frontier")
+        if self.mode == "random":
+            user_id = self._ids[self.rng.integers(0, len(self._ids))]
+        else:
+            user_id = heapq.heappop(self._heap)[2]
+            while user_id not in self._pending:
+                user_id = heapq.heappop(self._heap)[2]
+        return self.discard(user_id)
+
+    def discard(self, user_id):
+        """
+        Removes the user with the given id from the frontier (if it is there) and returns it.
+        """
+        user = self._pending.pop(user_id, None)
+        if user is not None and self.mode == "random":
+            position = self._positions.pop(user_id)
+            last_id = self._ids.pop()
+            if last_id != user_id:
+                self._ids[position] = last_id
+                self._positions[last_id] = position
+        return user
+
+    def mark_visited(self, user):
+        """
+        Adds the user to the index of visited users (removing it from the frontier if it was pending).
+        """
+        self.discard(user.id)
+        self.visited[user.id] = user
+        if user.user_follows is not None:
+            self.fetched_at["follows"].setdefault(user.id, fetch_time())
+
+    def users(self):
+        """
+        Returns all the users seen by the crawl, the visited ones first.
+        """
+        return list(self.visited.values()) + list(self._pending.values())
+
+    def users_df(self):
+        """
+        Returns the users seen by the crawl as a dataframe (one row per id, without the users that have no broadcaster_type)
+        with the time their profile and follows were fetched.
+        """
+        df = pd.DataFrame(self.users())\
+            .drop_duplicates(subset=["id"],keep="first")\
+                .dropna(subset=["broadcaster_type"])\
+                    .reset_index(drop=True)
+        for kind, fetched_at in self.fetched_at.items():
+            df = set_fetched_at(df, kind, fetched_at)
+        return df
+
+
+def add_spanish_streamers(frontier, records, exclude=()):
+    """
+    Adds to the frontier the Spanish streamers (with a broadcaster_type) of the given user
+    records (as returned by `User.get_users_records`) that have not been seen yet, and returns
+    the User objects that were added. Only the users that are added are made into User objects.
+
+    Parameters
+    ----------
+    frontier : Frontier
+        The frontier of the crawl.
+    records : list
+        The dicts with the data of the users.
+    exclude : set
+        Ids of users that must not be added (e.g. those being expanded at the moment).
+    """
+    added_users = []
+    for record in records:
+        if record["lang"] == "es" and record["broadcaster_type"] \
+                and record["id"] not in exclude and not frontier.seen(record["id"]):
+            user = User(**record)
+            frontier.add(user)
+            added_users.append(user)
+    return added_users
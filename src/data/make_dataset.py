@@ -6,6 +6,12 @@ import pandas as pd
 import numpy as np
 
 from ..user import User
+from .async_crawl import make_data_from_root_user_async, get_user_follows_async
+from .checkpoint import CrawlJournal, apply_journal_updates
+from .frontier import Frontier, add_spanish_streamers
+from .enrich import fetch_concurrently, get_num_followers_async
+from .storage import read_dataset, write_dataset, fetch_time, set_fetched_at
+from .refresh import REFRESH_TTL
 
 import logging
 # Set the logger format to show the name, time in minutes, and message
@@ -22,11 +28,12 @@ Extract the data required to carry the analysis of hispanic twitch streamers
 Usage: 
 ----------
 ```
-python -m src.data --root_user "ibai" --output_file "data/data.csv" --max_users 10000 --get_follows_of_top 1000 --get_num_followers_of_top 1000
+python -m src.data --root_user "ibai" --output_file "data/streamers.parquet" --max_users 10000 --get_follows_of_top 1000 --get_num_followers_of_top 1000
 ```
 """
 
-def make_dataset(root_user="ibai",output_file="data/data.csv",max_users=5000,get_follows_of_top=0,get_num_followers_of_top=0):
+def make_dataset(root_user="ibai",output_file="data/streamers.parquet",max_users=5000,get_follows_of_top=0,get_num_followers_of_top=0,engine="sync",concurrency=32,
+    resume=False,journal_file=None,frontier="random"):
     """
     Runs data processing scripts to obtain the data  and save it to the /data directory
 
@@ -35,12 +42,22 @@ def make_dataset(root_user="ibai",output_file="data/data.csv",max_users=5000,get
     root_user : str
         The name of the root user to start the tree from.
     output_file : str
-        The name of the output file.
+        The name of the output file. Its extension sets the format of the dataset (.parquet, .feather or .csv), see `write_dataset`.
     max_users : int
         The maximum number of users to retrieve.
     get_follows_of_top : int
         The number of top users (by view count) to get the follows of after obtaining the information 
         of all the requested users. If 0 then follows wont be retrieved. If -1 then the follows of all users will be retrieved.
+    engine : str
+        "sync" to expand the tree one user at a time or "async" to expand up to {concurrency} users at the same time.
+    concurrency : int
+        The maximum number of requests in flight at the same time when engine="async" and in the enrichment passes.
+    resume : bool
+        If True, the crawl and enrichment passes are resumed from the journal of a previous run instead of starting from scratch.
+    journal_file : str
+        The path of the checkpoint journal. Defaults to {output_file}.journal
+    frontier : str
+        "random" to expand the users of the tree in random order or "priority" to expand those with the highest view count first.
     """
     logger.info(f'making dataset of followers from initial user "{root_user}".')
 
@@ -49,21 +66,42 @@ def make_dataset(root_user="ibai",output_file="data/data.csv",max_users=5000,get
     if not os.path.exists(output_file_dir):
         os.makedirs(output_file_dir)
 
-    df = make_data_from_root_user(root_user_name=root_user,output_file=output_file,max_users=max_users)
+    journal = get_journal(output_file,journal_file,resume)
+
+    if engine == "async":
+        df = make_data_from_root_user_async(root_user_name=root_user,output_file=output_file,max_users=max_users,concurrency=concurrency,
+            journal=journal,resume=resume,frontier_mode=frontier)
+    else:
+        df = make_data_from_root_user(root_user_name=root_user,output_file=output_file,max_users=max_users,journal=journal,resume=resume,
+            frontier_mode=frontier)
 
     if get_follows_of_top:
         only_top = len(df) if get_follows_of_top==-1 else get_follows_of_top
-        df = extract_follows_from_users_df(df,output_file=output_file,only_top=only_top)
+        df = extract_follows_from_users_df(df,output_file=output_file,only_top=only_top,journal=journal,resume=resume,
+            concurrency=concurrency)
      
     if get_num_followers_of_top:
         only_top = len(df) if get_num_followers_of_top==-1 else get_num_followers_of_top
-        df = extract_num_followers_from_users_df(df,output_file=output_file,only_top=only_top)
+        df = extract_num_followers_from_users_df(df,output_file=output_file,only_top=only_top,journal=journal,resume=resume,
+            concurrency=concurrency)
 
     if output_file:
+        # The times each kind of data was fetched, used by `refresh_dataset` to find the stale data (NaT if never fetched)
+        for kind in REFRESH_TTL:
+            df = set_fetched_at(df,kind,{})
         logger.info(f'writing dataset to output file {output_file}')
-        df.drop_duplicates(subset=["id"],keep="first").to_csv(output_file,index=False)
+        write_dataset(df.drop_duplicates(subset=["id"],keep="first"),output_file)
+
+def get_journal(output_file=None,journal_file=None,resume=False):
+    """
+    Returns the CrawlJournal used to checkpoint the progress of the pipeline that writes to {output_file}
+    (or None if there is neither an output file nor a journal file). If not {resume}, the previous journal is discarded.
+    """
+    if not journal_file and not output_file:
+        return None
+    return CrawlJournal(journal_file or f"{output_file}.journal",reset=not resume)
 
-def make_data_from_root_user(root_user_name,output_file=None,max_users=None):
+def make_data_from_root_user(root_user_name,output_file=None,max_users=None,journal=None,resume=False,frontier_mode="random"):
     """
     Generate a dataset from a tree of twitch users follows starting from the follows of the given root user until it is manually stopped.
 
@@ -71,6 +109,16 @@ def make_data_from_root_user(root_user_name,output_file=None,max_users=None):
     ----------
     root_user_name : str
         The name of the root user to start the tree from.
+    output_file : str
+        The path to the output file.
+    max_users : int
+        The maximum number of users to retrieve.
+    journal : CrawlJournal
+        If given, the progress of the crawl is appended to this journal at every iteration.
+    resume : bool
+        If True, the crawl is resumed from the state recorded in {journal}.
+    frontier_mode : str
+        "random" to expand the users of the tree in random order or "priority" to expand those with the highest view count first.
     
     Returns
     -------
@@ -82,60 +130,76 @@ def make_data_from_root_user(root_user_name,output_file=None,max_users=None):
         logger.info(f'New users will be fetched until {max_users} users are reached or the program is manually interrupted...')
     else:
         logger.info(f'New users will be fetched until the program is manually interrupted. Use ctrl+c when you wish to stop.')
-    # Get the root user
-    root_user = User.from_name(user_name=root_user_name)
-    assert root_user.lang == "es", "Only Spanish users can be fetched."
-    users = [root_user]
-    users_with_retrieved_follows = []
-    itt = 0
+    rng = np.random.default_rng()
+    frontier = Frontier(mode=frontier_mode,rng=rng)
+    state = journal.load() if journal is not None and resume else None
+    if state is not None and state.users:
+        logger.info(f"Resuming the crawl from the journal {journal.path}...")
+        all_users = {user_id: User(**user) for user_id, user in state.users.items()}
+        for kind, fetched_at in state.fetched_at.items():
+            frontier.fetched_at[kind].update(fetched_at)
+        for user_id in state.visited:
+            frontier.mark_visited(all_users[user_id])
+        for user_id in state.frontier:
+            frontier.add(all_users[user_id])
+        if state.rng_state is not None:
+            rng.bit_generator.state = state.rng_state
+    else:
+        # Get the root user
+        root_user = User.from_name(user_name=root_user_name)
+        assert root_user.lang == "es", "Only Spanish users can be fetched."
+        frontier.add(root_user)
+        if journal is not None:
+            journal.write_users([root_user])
+    itt = len(frontier.visited)
+    crawl_done = state is not None and "crawl" in state.done
+    if crawl_done:
+        logger.info("The crawl of the journal had already finished.")
     try:
-        logger.info(f"The tree will be expanded randomly starting from the root.")        
-        while len(users)>0 and (max_users is None or (len(users)+len(users_with_retrieved_follows))<max_users):
-            # Get the next user randomly from the list of users
-            rand_user_ind = np.random.randint(0,len(users))
-            rand_user = users.pop(rand_user_ind)
+        logger.info(f"The tree will be expanded {'randomly' if frontier_mode == 'random' else 'by view count'} starting from the root.")
+        while not crawl_done and len(frontier)>0 and (max_users is None or (len(frontier)+len(frontier.visited))<max_users):
+            # Get the next user to expand from the frontier
+            rand_user = frontier.pop()
             # Expand the list of streamers from the follows of the random user
             try:
-                user_follows_ids = rand_user.follows
-                new_users = User.get_users(user_follows_ids)
+                rand_user.user_follows = User.get_user_follows(rand_user)
+                new_users = User.get_users_records(rand_user.user_follows)
             except Exception as e:
                 logger.error(f"Error while fetching follows of user {rand_user.name} from the API. Error: {e}")
+                if journal is not None:
+                    journal.write_dropped(rand_user.id)
                 continue
-            users_with_retrieved_follows.append(rand_user)
-            users = list(set(users).union(set(new_users)))
-            # Remove users that are not in Spanish streamers
-            users = [user for user in users if user.lang == "es" and user.broadcaster_type and user not in users_with_retrieved_follows]
+            frontier.mark_visited(rand_user)
+            # Add only the Spanish streamers that have not been seen yet
+            added_users = add_spanish_streamers(frontier,new_users)
+            if journal is not None:
+                journal.write_visited(rand_user,rng_state=rng.bit_generator.state)
+                journal.write_users(added_users)
             if itt % 10 == 0:
-                logger.info(f"Iteration {itt+1}: {len(users)+len(users_with_retrieved_follows)} users have been retrieved until now.")
-                if output_file:
-                    logger.info("writing dataset to {}".format(output_file))
-                    pd.DataFrame(users_with_retrieved_follows+users)\
-                        .drop_duplicates(subset=["id"],keep="first")\
-                            .dropna(subset=["broadcaster_type"])\
-                                .reset_index(drop=True).to_csv(output_file,index=False)
+                logger.info(f"Iteration {itt+1}: {len(frontier)+len(frontier.visited)} users have been retrieved until now.")
             itt += 1
         else:
-            logger.info(f"max_users reached at iteration {itt}. {len(users)+len(users_with_retrieved_follows)} users were retrieved.")
+            logger.info(f"max_users reached at iteration {itt}. {len(frontier)+len(frontier.visited)} users were retrieved.")
+            if journal is not None and not crawl_done:
+                journal.write_done("crawl")
     except KeyboardInterrupt:
         logger.info("KeyboardInterrupt received. Stopping the program..")  
-        logger.info(f"A total of {len(users)+len(users_with_retrieved_follows)} users were retrieved. Number of iterations: {itt}")
+        logger.info(f"A total of {len(frontier)+len(frontier.visited)} users were retrieved. Number of iterations: {itt}")
     
-    if len(users_with_retrieved_follows+users)==0:
+    if len(frontier)+len(frontier.visited)==0:
         logger.info("No users were retrieved. Exiting.")
         return pd.DataFrame()
 
-    df =  pd.DataFrame(users_with_retrieved_follows+users)\
-            .drop_duplicates(subset=["id"],keep="first")\
-                .dropna(subset=["broadcaster_type"])\
-                    .reset_index(drop=True)
+    df = frontier.users_df()
     if output_file:
         logger.info("writing dataset to file before stopping...")
-        df.to_csv(output_file,index=False)
+        write_dataset(df,output_file)
     return df
 
-def extract_follows_from_users_df(df_or_file,output_file=None,only_top=1000,print_every=10):
+def extract_follows_from_users_df(df_or_file,output_file=None,only_top=1000,print_every=100,journal=None,resume=False,concurrency=32):
     """
     Extract the follows from a dataframe of users and returns the same dataframe but with the follows of each user.
+    The pages of follows of the different users are requested concurrently.
 
     Parameters
     ----------
@@ -145,35 +209,45 @@ def extract_follows_from_users_df(df_or_file,output_file=None,only_top=1000,prin
         The path to the output file.
     only_top : int
         If not None, only the follows of the top {only_top} users will be fetched and returned. Otherwise, all the follows will be fetched.
+    print_every : int
+        The number of users that have been processed will be printed every print_every iterations.
+    journal : CrawlJournal
+        If given, the follows of each user are appended to this journal as soon as all of them are fetched.
+    resume : bool
+        If True, the follows already recorded in {journal} are not fetched again.
+    concurrency : int
+        The maximum number of requests in flight at the same time.
     """
     if isinstance(df_or_file,str):
-        df = pd.read_csv(df_or_file,lineterminator='\n')
+        df = read_dataset(df_or_file)
     else:
         df = df_or_file
-    users_of_df = User.from_df(df.drop_duplicates(subset=['name','id'],keep='first'))
-    users_sorted = sorted(users_of_df,key=lambda x: x.view_count if x.user_follows is None else 0,reverse=True)
-    only_top = len(users_of_df) if only_top is None or only_top>len(df) else only_top
+    if journal is not None and resume:
+        df = apply_journal_updates(df,journal.load().updates)
+    df = df.drop_duplicates(subset=["id"],keep="first").reset_index(drop=True)
+    only_top = len(df) if only_top is None or only_top>len(df) else only_top
+    # Only the users without follows are fetched, those with the most views first
+    user_ids = df.loc[df["user_follows"].isnull()].sort_values("view_count",ascending=False)["id"].astype(str).head(only_top).tolist()
     logger.info(f'Extracting all the follows of the top {only_top}/{len(df)} users in the dataset (by view count)...')
-    try:
-        for i,user in enumerate(users_sorted[:only_top]):
-            if user.user_follows is None:
-                user.get_follows()
-            if (i+1) % print_every == 0 or i==0:
-                logger.info(f"{i+1}/{only_top} have been processed.")
-                if output_file:
-                    logger.info("writing dataset to file {}".format(output_file))
-                    pd.DataFrame(users_of_df).drop_duplicates(subset=["id"],keep="first").to_csv(output_file,index=False)
-    except KeyboardInterrupt:
-        logger.info("KeyboardInterrupt received. Stopping the program..")
-    df = pd.DataFrame(users_of_df).drop_duplicates(subset=["id"],keep="first")
+    fetched_at = {}
+    def on_result(user_id, user_follows):
+        fetched_at[user_id] = fetch_time()
+        if journal is not None:
+            journal.write_update(user_id,user_follows=user_follows,follows_fetched_at=fetched_at[user_id])
+    follows = fetch_concurrently(get_user_follows_async,user_ids,concurrency=concurrency,on_result=on_result,
+        print_every=print_every,description="follows")
+    logger.info(f"The follows of {len(follows)}/{len(user_ids)} users were retrieved.")
+    df["user_follows"] = df["user_follows"].astype(object).where(df["user_follows"].notnull(),df["id"].astype(str).map(follows))
+    df = set_fetched_at(df,"follows",fetched_at)
     if output_file:
         logger.info("writing dataset to file before stopping...")
-        df.to_csv(output_file,index=False)
-    return pd.DataFrame(users_of_df)
+        write_dataset(df,output_file)
+    return df
 
-def extract_num_followers_from_users_df(df_or_file,output_file=None,only_top=1000,print_every=10):
+def extract_num_followers_from_users_df(df_or_file,output_file=None,only_top=1000,print_every=100,journal=None,resume=False,concurrency=32):
     """
-    Extract the number of followers from a dataframe of users and returns the same dataframe
+    Extract the number of followers from a dataframe of users and returns the same dataframe.
+    The requests of the different users are made concurrently.
 
     Parameters
     ----------
@@ -185,39 +259,37 @@ def extract_num_followers_from_users_df(df_or_file,output_file=None,only_top=100
         If not None, only the num followers of the top {only_top} users will be fetched and returned. Otherwise, all the num_followers will be fetched.
     print_every : int
         The number of users that have been processed will be printed every print_every iterations.
+    journal : CrawlJournal
+        If given, the number of followers of each user is appended to this journal as soon as it is fetched.
+    resume : bool
+        If True, the number of followers already recorded in {journal} are not fetched again.
+    concurrency : int
+        The maximum number of requests in flight at the same time.
     """
     if isinstance(df_or_file,str):
-        df = pd.read_csv(df_or_file,lineterminator='\n')
+        df = read_dataset(df_or_file)
     else:
         df = df_or_file
-    users_of_df = User.from_df(df.drop_duplicates(subset=['name','id'],keep='first'))
-    users_sorted = sorted(users_of_df,key=lambda x: x.view_count if x.num_followers is None else 0,reverse=True)
-    only_top = len(users_of_df) if only_top is None or only_top>len(df) else only_top
+    if journal is not None and resume:
+        df = apply_journal_updates(df,journal.load().updates)
+    df = df.drop_duplicates(subset=["id"],keep="first").reset_index(drop=True)
+    only_top = len(df) if only_top is None or only_top>len(df) else only_top
+    # Only the users without num_followers are fetched, those with the most views first
+    user_ids = df.loc[df["num_followers"].isnull()].sort_values("view_count",ascending=False)["id"].astype(str).head(only_top).tolist()
     logger.info(f'Extracting all the number of followers of the top {only_top}/{len(df)} users in the given dataframe (by view count)...')
-    try:
-        for i,user in enumerate(users_sorted[:only_top]):
-            if user.num_followers is None:
-                try:
-                    # Extract the number of followers from the API
-                    user.get_num_followers()
-                except Exception as e:
-                    # If the API fails, continue with the next user
-                    if isinstance(e,KeyboardInterrupt):
-                        logger.info("KeyboardInterrupt received. Stopping the program..")
-                        break
-                    logger.error(f"Error while getting the number of followers of {user.name}. Error: {e}")
-                    continue
-            if (i+1) % print_every == 0 or i==0: # Print the progress every 10 iterations
-                logger.info(f"{i+1}/{only_top} have been processed.")
-                if output_file: # Write the dataframe to file
-                    logger.info("writing dataset to file {}".format(output_file))
-                    pd.DataFrame(users_of_df).drop_duplicates(subset=["id"],keep="first").to_csv(output_file,index=False)
-    except KeyboardInterrupt:
-        logger.info("KeyboardInterrupt received. Stopping the program..")
-    df = pd.DataFrame(users_of_df).drop_duplicates(subset=["id"],keep="first")
+    fetched_at = {}
+    def on_result(user_id, num_followers):
+        fetched_at[user_id] = fetch_time()
+        if journal is not None:
+            journal.write_update(user_id,num_followers=num_followers,num_followers_fetched_at=fetched_at[user_id])
+    num_followers = fetch_concurrently(get_num_followers_async,user_ids,concurrency=concurrency,on_result=on_result,
+        print_every=print_every,description="number of followers")
+    logger.info(f"The number of followers of {len(num_followers)}/{len(user_ids)} users was retrieved.")
+    df["num_followers"] = df["num_followers"].fillna(df["id"].astype(str).map(num_followers))
+    df = set_fetched_at(df,"num_followers",fetched_at)
     if output_file:
         logger.info("writing dataset to file before stopping...")
-        df.to_csv(output_file,index=False)
+        write_dataset(df,output_file)
     return df
 
 
@@ -0,0 +1,189 @@
+import os, json, time, logging
+import numpy as np
+import pandas as pd
+
+from ..user import USER_FIELDS
+from ..twitch_cache import DAY
+from .async_crawl import get_user_follows_async, get_users_records_async
+from .enrich import fetch_concurrently, get_num_followers_async
+from .storage import read_dataset, write_dataset, _parse_follows
+
+logger = logging.getLogger(os.path.basename(__name__).split(".")[-1])
+
+# Maximum age (in seconds) of each kind of data of a streamer before it is fetched again
+REFRESH_TTL = {
+    "profile": 30 * DAY,
+    "follows": 7 * DAY,
+    "num_followers": 7 * DAY,
+}
+
+# Fields of the dataset that come from the profile of a user (endpoints users and channels)
+PROFILE_FIELDS = [f for f in USER_FIELDS if f not in ("id", "num_followers", "user_follows")]
+
+
+def get_delta_log_path(dataset_path):
+    """
+    Returns the path of the edge delta log of the dataset at {dataset_path} (e.g. data/streamers.deltas.jsonl).
+    """
+    return os.path.splitext(dataset_path.rstrip("/"))[0] + ".deltas.jsonl"
+
+
+def diff_follows(old_follows, new_follows):
+    """
+    Returns the ids (as int64 arrays) of the users that were added to and removed from a follow list.
+    """
+    old_follows, new_follows = _parse_follows(old_follows), _parse_follows(new_follows)
+    old_follows = np.array([], dtype=np.int64) if old_follows is None else old_follows
+    new_follows = np.array([], dtype=np.int64) if new_follows is None else new_follows
+    return np.setdiff1d(new_follows, old_follows), np.setdiff1d(old_follows, new_follows)
+
+
+class EdgeDeltaLog:
+    """
+    Append-only log (one json record per line) of the changes of the follows between refreshes of a dataset.
+
+    Every record has the follows {"id": ..., "added": [...], "removed": [...]} of one user and the time
+    they were fetched ("fetched_at"), so the consumers of the graph (e.g. the incremental metrics) can
+    apply only what changed since the last time they read the log.
+
+    Parameters
+    ----------
+    path : str
+        The path of the log file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, records):
+        if not records:
+            return
+        with open(self.path, "a") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+    def read(self, since=None):
+        """
+        Returns the records of the log fetched after the timestamp {since} (all of them if None).
+        """
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping a corrupted record of the delta log {self.path}")
+                    continue
+                if since is None or record["fetched_at"] > since:
+                    records.append(record)
+        return records
+
+
+def get_stale_ids(df, kind, ttl, now):
+    """
+    Returns the ids of the users of {df} whose data of the given {kind} (profile, follows or num_followers)
+    was fetched more than {ttl} seconds before {now}. Users whose follows or number of followers were never
+    fetched are left to the enrichment passes.
+    """
+    fetched_at = df[f"{kind}_fetched_at"]
+    stale = fetched_at.isnull() | (fetched_at < now - pd.Timedelta(seconds=ttl))
+    if kind == "follows":
+        stale &= df["user_follows"].notnull()
+    elif kind == "num_followers":
+        stale &= df["num_followers"].notnull()
+    return df.loc[stale, "id"].astype(str).tolist()
+
+
+def refresh_dataset(dataset_path, output_file=None, ttl=None, delta_log=None, concurrency=32, print_every=100):
+    """
+    Refreshes the data of the streamers of a dataset that is older than its time to live instead of crawling it again.
+
+    The dataset keeps the time each kind of data of every user was fetched (the columns profile_fetched_at,
+    follows_fetched_at and num_followers_fetched_at, written by `make_dataset`). The profiles, follows and number
+    of followers older than their ttl are fetched again (bypassing the cache of responses) and the changes of the
+    follow lists are appended to an EdgeDeltaLog.
+    Datasets written before those columns existed are considered fetched when their file was last modified.
+
+    Parameters
+    ----------
+    dataset_path : str
+        The path of the dataset to refresh.
+    output_file : str
+        The path where the refreshed dataset is written. Defaults to {dataset_path}.
+    ttl : dict
+        The time to live (in seconds) of each kind of data ("profile", "follows" and "num_followers"). Defaults to REFRESH_TTL.
+    delta_log : str
+        The path of the log of the changes of the follows. Defaults to {dataset_path} with the extension .deltas.jsonl.
+    concurrency : int
+        The maximum number of requests in flight at the same time.
+    print_every : int
+        The progress will be logged every {print_every} users.
+    """
+    ttl = dict(REFRESH_TTL, **(ttl or {}))
+    output_file = output_file or dataset_path
+    log = EdgeDeltaLog(delta_log or get_delta_log_path(output_file))
+    df = read_dataset(dataset_path).drop_duplicates(subset=["id"], keep="first").reset_index(drop=True)
+    now = pd.Timestamp.now(tz="UTC")
+    file_time = pd.Timestamp(os.path.getmtime(dataset_path), unit="s", tz="UTC")
+    for kind in ttl:
+        if f"{kind}_fetched_at" not in df.columns:
+            df[f"{kind}_fetched_at"] = pd.Series(file_time, index=df.index)
+        df[f"{kind}_fetched_at"] = pd.to_datetime(df[f"{kind}_fetched_at"], utc=True)
+    ids = df["id"].astype(str)
+
+    # Profiles (requested in batches of 100 users)
+    stale_ids = get_stale_ids(df, "profile", ttl["profile"], now)
+    logger.info(f"Refreshing the profiles of {len(stale_ids)}/{len(df)} users...")
+    batches = [tuple(stale_ids[i:i+100]) for i in range(0, len(stale_ids), 100)]
+    results = fetch_concurrently(lambda client, batch: get_users_records_async(client, list(batch)), batches,
+        concurrency=concurrency, print_every=print_every, description="profiles", cache=False)
+    profiles = pd.DataFrame([record for records in results.values() for record in records], columns=USER_FIELDS)
+    if len(profiles):
+        profiles = profiles.drop_duplicates(subset=["id"]).set_index("id")
+        updated = ids.isin(profiles.index)
+        for field in PROFILE_FIELDS:
+            new_values = ids[updated].map(profiles[field])
+            if field == "created_at":
+                new_values = pd.to_datetime(new_values, utc=True)
+            df[field] = df[field].astype(object)
+            df.loc[updated, field] = new_values.values
+        df.loc[updated, "profile_fetched_at"] = now
+    missing = len(stale_ids) - (len(profiles))
+    if missing > 0:
+        logger.info(f"{missing} users were not returned by the API (they may have been deleted or banned).")
+
+    # Follows, diffed against the previous ones
+    stale_ids = get_stale_ids(df, "follows", ttl["follows"], now)
+    logger.info(f"Refreshing the follows of {len(stale_ids)}/{len(df)} users...")
+    follows = fetch_concurrently(get_user_follows_async, stale_ids, concurrency=concurrency, print_every=print_every,
+        description="follows", cache=False)
+    rows = dict(zip(ids, df.index))
+    user_follows = df["user_follows"].tolist()
+    deltas, n_added, n_removed = [], 0, 0
+    fetched_at = time.time()
+    for user_id, new_follows in follows.items():
+        row = rows[user_id]
+        added, removed = diff_follows(user_follows[row], new_follows)
+        if len(added) or len(removed):
+            deltas.append({"id": int(user_id), "added": added.tolist(), "removed": removed.tolist(), "fetched_at": fetched_at})
+            n_added, n_removed = n_added + len(added), n_removed + len(removed)
+        user_follows[row] = _parse_follows(new_follows)
+    df["user_follows"] = pd.Series(user_follows, index=df.index, dtype=object)
+    df.loc[ids.isin(follows.keys()), "follows_fetched_at"] = now
+    log.write(deltas)
+    logger.info(f"{n_added} follows were added and {n_removed} removed ({len(deltas)} users changed). They were logged to {log.path}")
+
+    # Number of followers
+    stale_ids = get_stale_ids(df, "num_followers", ttl["num_followers"], now)
+    logger.info(f"Refreshing the number of followers of {len(stale_ids)}/{len(df)} users...")
+    num_followers = fetch_concurrently(get_num_followers_async, stale_ids, concurrency=concurrency, print_every=print_every,
+        description="number of followers", cache=False)
+    refreshed = ids.isin(num_followers.keys())
+    df["num_followers"] = df["num_followers"].where(~refreshed, ids.map(num_followers))
+    df.loc[refreshed, "num_followers_fetched_at"] = now
+
+    logger.info(f"writing the refreshed dataset to {output_file}")
+    write_dataset(df, output_file)
+    return df
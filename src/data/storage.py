@@ -0,0 +1,229 @@
+import os, shutil, logging
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(os.path.basename(__name__).split(".")[-1])
+
+# Type of the user_follows column (the ids of the users each streamer follows)
+FOLLOWS_TYPE = pa.list_(pa.int64())
+
+# Follows stores already opened by this process, by the path of their dataset
+_loaded_follows = {}
+
+
+def _parse_follows(user_follows):
+    """
+    Returns the follows of a user as an array of int64 ids from a list, an array or
+    its string representation (as they end up when written to a csv).
+    """
+    if user_follows is None:
+        return None
+    if isinstance(user_follows, str):
+        user_follows = user_follows.strip("[]").replace("'", " ").replace('"', " ").replace(",", " ")
+        return np.array(user_follows.split(), dtype=np.int64)
+    if np.ndim(user_follows) == 0 and pd.isnull(user_follows):
+        return None
+    return np.asarray(user_follows, dtype=np.int64)
+
+
+def follows_to_arrow(user_follows):
+    """
+    Returns the follows of the users (a column of lists, arrays, their string representations or nulls)
+    as an arrow list<int64> array. Its `offsets` and `values` are the CSR representation of the follows.
+    """
+    if isinstance(user_follows, pa.ChunkedArray):
+        user_follows = user_follows.combine_chunks()
+    if isinstance(user_follows, pa.Array):
+        return user_follows.cast(FOLLOWS_TYPE)
+    try:
+        # Columns of arrays or lists (as read by `read_dataset`) are converted without going through Python
+        return pa.array(user_follows, type=FOLLOWS_TYPE, from_pandas=True)
+    except (pa.ArrowException, TypeError, ValueError):
+        return pa.array([_parse_follows(f) for f in user_follows], type=FOLLOWS_TYPE)
+
+
+def dataset_version(path):
+    """
+    Returns a string that changes every time the dataset at {path} is rewritten.
+    """
+    if os.path.isdir(path):
+        stats = [os.stat(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names]
+    else:
+        stats = [os.stat(path)]
+    return f"{max(s.st_mtime_ns for s in stats)}-{sum(s.st_size for s in stats)}"
+
+
+def fetch_time():
+    """
+    Returns the current time as an ISO string in UTC, to record when some data of a user was fetched.
+    """
+    return pd.Timestamp.now(tz="UTC").isoformat()
+
+
+def set_fetched_at(df, kind, fetched_at):
+    """
+    Sets the column {kind}_fetched_at of the dataframe of streamers {df} (the time their data of the given kind,
+    "profile", "follows" or "num_followers", was fetched) for the users in {fetched_at} (a dict of id: time).
+    The other users keep their previous time, or NaT if the column did not exist.
+    """
+    column = f"{kind}_fetched_at"
+    times = pd.to_datetime(df["id"].astype(str).map(fetched_at), utc=True)
+    if column in df.columns:
+        times = times.fillna(pd.to_datetime(df[column], utc=True))
+    df[column] = times
+    return df
+
+
+def to_arrow_table(df):
+    """
+    Returns the dataframe of streamers as an arrow table with integer ids, a datetime
+    created_at and user_follows as a native list<int64> column.
+    """
+    df = df.copy()
+    df["id"] = pd.to_numeric(df["id"]).astype("int64")
+    for col in ["num_followers", "view_count"]:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col]).astype("Int64")
+    if "created_at" in df.columns:
+        df["created_at"] = pd.to_datetime(df["created_at"], utc=True)
+    follows = None
+    if "user_follows" in df.columns:
+        follows = follows_to_arrow(df["user_follows"])
+        df = df.drop(columns="user_follows")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if follows is not None:
+        table = table.append_column(pa.field("user_follows", FOLLOWS_TYPE), follows)
+    return table
+
+
+def write_dataset(df, path, partition_cols=("broadcaster_type",)):
+    """
+    Writes the dataframe of streamers to {path}. The format depends on its extension:
+
+    - `.parquet`: a parquet dataset (a directory) partitioned by {partition_cols} (or a single file if there are none)
+    - `.feather` / `.arrow`: an uncompressed arrow file that can be memory-mapped
+    - `.csv`: a csv file (user_follows is written as a stringified list)
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The dataframe of streamers.
+    path : str
+        The path of the output file or directory.
+    partition_cols : tuple
+        The columns the parquet dataset is partitioned by.
+    """
+    if path.endswith(".csv"):
+        df = df.copy()
+        if "user_follows" in df.columns:
+            df["user_follows"] = [
+                None if f is None else [str(user_id) for user_id in f] for f in map(_parse_follows, df["user_follows"])
+            ]
+        df.to_csv(path, index=False)
+        return
+    table = to_arrow_table(df)
+    if path.endswith(".feather") or path.endswith(".arrow"):
+        feather.write_feather(table, path, compression="uncompressed")
+    elif path.endswith(".parquet"):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+        partition_cols = [col for col in partition_cols or () if col in table.column_names]
+        if partition_cols:
+            pq.write_to_dataset(table, path, partition_cols=partition_cols)
+        else:
+            pq.write_table(table, path)
+    else:
+        raise ValueError(f"Unknown format of the dataset {path}. Use a .parquet, .feather, .arrow or .csv file")
+
+
+def read_dataset(path, columns=None):
+    """
+    Reads a dataset of streamers written by `write_dataset` (or a csv of a previous version of the pipeline)
+    and returns it as a pandas dataframe with integer ids and user_follows as arrays of int64 ids.
+
+    Parameters
+    ----------
+    path : str
+        The path of the dataset.
+    columns : list
+        If given, only these columns are read.
+    """
+    if path.endswith(".csv"):
+        df = pd.read_csv(path, lineterminator='\n', usecols=columns)
+        if "user_follows" in df.columns:
+            df["user_follows"] = [_parse_follows(f) for f in df["user_follows"]]
+    elif path.endswith(".feather") or path.endswith(".arrow"):
+        df = pd.read_feather(path, columns=columns)
+    elif path.endswith(".parquet"):
+        df = pd.read_parquet(path, columns=columns)
+        # Partition columns are read as categoricals
+        for col in df.columns:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype(object)
+    else:
+        raise ValueError(f"Unknown format of the dataset {path}. Use a .parquet, .feather, .arrow or .csv file")
+    # Datasets of previous versions of the pipeline stored the ids as strings
+    if "id" in df.columns and df["id"].dtype != np.int64:
+        df["id"] = pd.to_numeric(df["id"]).astype("int64")
+    return df
+
+
+class FollowsStore:
+    """
+    The follows of the streamers of a dataset written by `write_dataset`, looked up by id.
+
+    Feather/Arrow files are memory-mapped, so the follows of a user are read from the file when they are
+    asked for and their pages can be evicted by the OS. Parquet and csv datasets are read once.
+
+    Parameters
+    ----------
+    path : str
+        The path of the dataset.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.version = dataset_version(path)
+        if path.endswith(".feather") or path.endswith(".arrow"):
+            table = feather.read_table(pa.memory_map(path), columns=["id", "user_follows"], memory_map=True)
+            ids = pd.to_numeric(table.column("id").to_pandas()).astype("int64").values
+            self.follows = table.column("user_follows")
+        else:
+            df = read_dataset(path, columns=["id", "user_follows"])
+            ids = df["id"].values
+            self.follows = pa.chunked_array([follows_to_arrow(df["user_follows"])])
+        # Rows sorted by id (the first row of each id comes first) to find a user with a binary search
+        self.order = np.argsort(ids, kind="stable")
+        self.sorted_ids = ids[self.order]
+
+    def __len__(self):
+        return len(self.sorted_ids)
+
+    def get(self, user_id):
+        """
+        Returns the ids of the users that the user with id {user_id} follows as an array of int64, or None
+        if the user is not in the dataset or its follows were not retrieved.
+        """
+        user_id = int(user_id)
+        position = np.searchsorted(self.sorted_ids, user_id)
+        if position == len(self.sorted_ids) or self.sorted_ids[position] != user_id:
+            return None
+        follows = self.follows[int(self.order[position])]
+        return follows.values.to_numpy() if follows.is_valid else None
+
+
+def load_follows_store(path):
+    """
+    Returns the FollowsStore of the dataset at {path}. It is opened once per process and again only if the file changes.
+    """
+    version = dataset_version(path)
+    store = _loaded_follows.get(path)
+    if store is None or store.version != version:
+        store = FollowsStore(path)
+        _loaded_follows[path] = store
+    return store
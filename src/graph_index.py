@@ -0,0 +1,233 @@
+import os, json, logging
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from .data.storage import read_dataset, follows_to_arrow, dataset_version
+
+logger = logging.getLogger(os.path.basename(__name__).split(".")[-1])
+
+# Arrays of a GraphIndex stored in its directory (one .npy file each)
+INDEX_ARRAYS = ["ids", "out_indptr", "out_indices", "in_indptr", "in_indices", "has_follows", "positions"]
+
+# Indexes already loaded by this process, by the path of their dataset
+_loaded_indexes = {}
+
+
+class GraphIndex:
+    """
+    Compact index of the graph of follows between the streamers of a dataset.
+
+    Every streamer is a node with a dense int32 id (its position in `ids`, which is sorted) and the
+    follows between streamers of the dataset are stored as two CSR adjacency structures:
+    the users followed by node i are `out_indices[out_indptr[i]:out_indptr[i+1]]` and its
+    followers (inside the dataset) are `in_indices[in_indptr[i]:in_indptr[i+1]]`. Follows to
+    users outside of the dataset and duplicated follows are dropped. `has_follows` tells which
+    nodes had their follows retrieved (the rest have no out-edges because they are unknown) and
+    `positions` is the position of each node in its dataset, to list nodes in the order of the dataset.
+
+    The arrays can be saved as .npy files and loaded back memory-mapped, so the graph functions
+    and the pages of the dashboard share the same index instead of building networkx graphs.
+
+    Parameters
+    ----------
+    ids : np.ndarray
+        The (sorted) Twitch ids of the nodes.
+    out_indptr, out_indices : np.ndarray
+        The CSR arrays of the follows of each node.
+    in_indptr, in_indices : np.ndarray
+        The CSR arrays of the followers of each node.
+    has_follows : np.ndarray
+        Boolean mask of the nodes whose follows are known. All of them by default.
+    positions : np.ndarray
+        The position of each node in the dataset (without duplicates). The order of the ids by default.
+    """
+
+    def __init__(self, ids, out_indptr, out_indices, in_indptr, in_indices, has_follows=None, positions=None):
+        self.ids = ids
+        self.out_indptr = out_indptr
+        self.out_indices = out_indices
+        self.in_indptr = in_indptr
+        self.in_indices = in_indices
+        self.has_follows = np.ones(len(ids), dtype=bool) if has_follows is None else has_follows
+        self.positions = np.arange(len(ids), dtype=np.int64) if positions is None else positions
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def n_nodes(self):
+        return len(self.ids)
+
+    @property
+    def n_edges(self):
+        return len(self.out_indices)
+
+    @classmethod
+    def from_edges(cls, ids, sources, targets, has_follows=None, positions=None):
+        """
+        Builds the index from the edges (sources[i] follows targets[i]) given as node ids of the sorted {ids}.
+        """
+        n = len(ids)
+        # Remove duplicated edges and sort them by source and then by target
+        edges = np.unique(sources.astype(np.int64) * n + targets)
+        sources, targets = (edges // n).astype(np.int32), (edges % n).astype(np.int32)
+        out_indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n), out=out_indptr[1:])
+        order = np.argsort(targets, kind="stable")
+        in_indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(targets, minlength=n), out=in_indptr[1:])
+        return cls(ids, out_indptr, targets, in_indptr, sources[order], has_follows, positions)
+
+    @classmethod
+    def from_df(cls, df):
+        """
+        Builds the index from a dataframe of streamers with the columns id and user_follows.
+        """
+        if "id" not in df.columns:
+            df = df.reset_index()
+        df = df.drop_duplicates(subset=["id"], keep="first")
+        row_ids = pd.to_numeric(df["id"]).to_numpy(dtype=np.int64)
+        follows = follows_to_arrow(df["user_follows"])
+        offsets = follows.offsets.to_numpy()
+        values = follows.flatten().to_numpy()
+        ids = np.sort(row_ids)
+        rows = np.searchsorted(ids, row_ids)
+        has_follows = np.zeros(len(ids), dtype=bool)
+        has_follows[rows] = follows.is_valid().to_numpy(zero_copy_only=False)
+        positions = np.empty(len(ids), dtype=np.int64)
+        positions[rows] = np.arange(len(rows))
+        # Node of the user of each row, repeated once per follow of the user
+        sources = np.repeat(rows, np.diff(offsets))
+        targets = np.searchsorted(ids, values)
+        inside = targets < len(ids)
+        inside[inside] = ids[targets[inside]] == values[inside]
+        return cls.from_edges(ids, sources[inside], targets[inside], has_follows, positions)
+
+    @classmethod
+    def from_dataset(cls, path):
+        """
+        Builds the index from the dataset of streamers at {path} (reading only its id and user_follows columns).
+        """
+        return cls.from_df(read_dataset(path, columns=["id", "user_follows"]))
+
+    def node_of(self, user_ids):
+        """
+        Returns the node ids of the given Twitch ids (an id or an array of them, as integers or strings).
+        Ids that are not in the graph are mapped to -1.
+        """
+        user_ids = np.asarray(user_ids).astype(np.int64)
+        nodes = np.searchsorted(self.ids, user_ids).clip(max=max(len(self.ids) - 1, 0))
+        found = self.ids[nodes] == user_ids if len(self.ids) else np.zeros(user_ids.shape, dtype=bool)
+        return np.where(found, nodes, -1).astype(np.int32)
+
+    def out_neighbors(self, node):
+        return self.out_indices[self.out_indptr[node]:self.out_indptr[node + 1]]
+
+    def in_neighbors(self, node):
+        return self.in_indices[self.in_indptr[node]:self.in_indptr[node + 1]]
+
+    def subgraph_edges(self, nodes):
+        """
+        Returns the edges (sources, targets) between the given nodes, as node ids, in one pass over their out-edges.
+        """
+        nodes = np.asarray(nodes, dtype=np.int64)
+        starts, counts = self.out_indptr[nodes], self.out_indptr[nodes + 1] - self.out_indptr[nodes]
+        positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        sources, targets = np.repeat(nodes, counts), np.asarray(self.out_indices)[positions]
+        inside = np.isin(targets, nodes)
+        return sources[inside], targets[inside]
+
+    def out_degree(self):
+        return np.diff(self.out_indptr)
+
+    def in_degree(self):
+        return np.diff(self.in_indptr)
+
+    def to_scipy(self):
+        """
+        Returns the adjacency matrix (A[i, j] = 1 if node i follows node j) as a scipy CSR matrix.
+        """
+        data = np.ones(self.n_edges, dtype=np.float64)
+        return sp.csr_matrix((data, self.out_indices, self.out_indptr), shape=(self.n_nodes, self.n_nodes))
+
+    def to_networkx(self):
+        """
+        Returns the graph as a networkx DiGraph whose nodes are the Twitch ids (as strings).
+        """
+        import networkx as nx
+        G = nx.DiGraph()
+        names = self.ids.astype(str)
+        G.add_nodes_from(names)
+        sources = np.repeat(np.arange(self.n_nodes), self.out_degree())
+        G.add_edges_from(zip(names[sources], names[self.out_indices]))
+        return G
+
+    def save(self, path, version=None):
+        """
+        Saves the arrays of the index as .npy files in the directory {path}.
+        {version} is the version of the dataset it was built from (see `dataset_version`).
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in INDEX_ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"version": version, "n_nodes": self.n_nodes, "n_edges": self.n_edges}, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """
+        Loads an index saved with `save`. By default its arrays are memory-mapped (read only).
+        """
+        return cls(*[np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in INDEX_ARRAYS])
+
+
+def get_index_path(dataset_path):
+    """
+    Returns the directory where the graph index of the dataset at {dataset_path} is stored
+    (e.g. data/streamers.graph for data/streamers.parquet).
+    """
+    return os.path.splitext(dataset_path.rstrip("/"))[0] + ".graph"
+
+
+def get_saved_version(index_path):
+    """
+    Returns the version of the dataset the index saved in {index_path} was built from, or None if
+    there is no index (or it lacks any of its arrays).
+    """
+    meta_file = os.path.join(index_path, "meta.json")
+    files = [meta_file] + [os.path.join(index_path, f"{name}.npy") for name in INDEX_ARRAYS]
+    if not all(os.path.exists(f) for f in files):
+        return None
+    with open(meta_file) as f:
+        return json.load(f).get("version")
+
+
+def load_graph_index(dataset_path, rebuild=False):
+    """
+    Returns the GraphIndex of the dataset of streamers at {dataset_path}.
+
+    The index is loaded (memory-mapped) from the directory next to the dataset and it is only built
+    (and saved) if it does not exist yet or the dataset changed since it was built. It is loaded once
+    per process: the following calls with the same dataset return the same object.
+
+    Parameters
+    ----------
+    dataset_path : str
+        The path of the dataset of streamers.
+    rebuild : bool
+        If True, the index is built again even if it is up to date.
+    """
+    version = dataset_version(dataset_path)
+    index = _loaded_indexes.get(dataset_path)
+    if index is not None and index[0] == version and not rebuild:
+        return index[1]
+    index_path = get_index_path(dataset_path)
+    if rebuild or get_saved_version(index_path) != version:
+        logger.info(f"Building the graph index of {dataset_path}...")
+        graph = GraphIndex.from_dataset(dataset_path)
+        graph.save(index_path, version=version)
+        logger.info(f"The graph index ({graph.n_nodes} nodes, {graph.n_edges} edges) was saved to {index_path}")
+    graph = GraphIndex.load(index_path)
+    _loaded_indexes[dataset_path] = (version, graph)
+    return graph
@@ -1,9 +1,15 @@
 from pyvis.network import Network
 import pandas as pd
 import numpy as np
+import pyarrow as pa
 import networkx as nx
 import matplotlib.pyplot as plt
 
+from .data.storage import follows_to_arrow, _parse_follows
+from .graph_index import load_graph_index
+from .layout import get_layout, layout_scale
+from .cofollow import CoFollowIndex, load_cofollow_index
+
 
 def df_to_nx(df):
     """
@@ -33,7 +39,8 @@ def get_k_common_followers(df_or_filename, filter_weight=0.05, common_followers_
     Parameters
     ----------
     df_or_filename : str or pandas dataframe
-        The dataframe or filename of the streamer data
+        The dataframe or filename of the streamer data. If it is a filename, the co-follow weights are
+        precomputed once and then read from its CoFollowIndex (see `load_cofollow_index`).
     filter_weight : float
         The minimum weight of a follower to be considered
     common_followers_with : str
@@ -41,53 +48,51 @@ def get_k_common_followers(df_or_filename, filter_weight=0.05, common_followers_
     '''
 
     if isinstance(df_or_filename, str):
-        if df_or_filename.endswith("csv"):
-            df = pd.read_csv(df_or_filename, lineterminator='\n')
-        elif df_or_filename.endswith("feather"):
-            df = pd.read_feather(df_or_filename)
+        cofollow = load_cofollow_index(df_or_filename)
     else:
-        df = df_or_filename
-
-    df = df.dropna(how='any',
-                    subset=['user_follows'])
-
-    follows_of_user = df.loc[df.name.str.lower(
-    ) == common_followers_with.lower()].iloc[0]["user_follows"]
-
-    df = df.loc[df['id'].isin(follows_of_user)]
+        cofollow = CoFollowIndex.from_df(df_or_filename)
 
-    weigths = [np.round(len(list(set(df['id']).intersection(
-        df["user_follows"].values[i])))/len(df), 2) for i in range(len(df))]
+    nodes, weights = cofollow.top_k(common_followers_with)
+    weights = np.round(weights, 2)
+    # remove users without common followers with the streamer
+    keep = weights > filter_weight
 
-    print(len(weigths))
     df1 = pd.DataFrame({
-        "source": [common_followers_with]*len(df),
-        "target": df["name"],
-        "edge_weights": weigths,
-    }).reset_index().drop("index", axis=1).sort_values("edge_weights", ascending=False)
-
-    # remove users without common folloers with Ibai
-    df1 = df1[df1.edge_weights > filter_weight]
+        "source": [common_followers_with]*int(keep.sum()),
+        "target": cofollow.names[nodes[keep]],
+        "edge_weights": weights[keep],
+    })
 
     return df1
 
 
-def plot_graph_pyVis(df, output_file):
-  ''' df needs to contain three columns: starting node, ending node and the edge weigth'''
+def plot_graph_pyVis(df, output_file, layout=True):
+  ''' df needs to contain three columns: starting node, ending node and the edge weigth.
+  If layout is True, the positions of the nodes are computed here (see `get_layout`) and the physics
+  simulation of the browser is disabled. Otherwise, the browser lays out the graph with barnes hut.'''
 
   net = Network(height='750px', width='100%',
                     bgcolor='#222222', font_color='white', notebook=True)
 
-  # set the physics layout of the network
-  net.barnes_hut()
-
   sources, targets, weigths = df.iloc[:, 0], df.iloc[:, 1], df.iloc[:, 2]
 
+  if layout:
+      nodes = pd.unique(pd.concat([sources, targets], ignore_index=True))
+      positions = get_layout(nodes, sources, targets, weigths.astype(float), scale=layout_scale(len(nodes)))
+      net.toggle_physics(False)
+  else:
+      # set the physics layout of the network
+      net.barnes_hut()
+
   edge_data = zip(sources, targets, weigths)
 
   for src,dst,w in edge_data:
-      net.add_node(src, src, title=src)
-      net.add_node(dst, dst, title=dst)
+      for node in (src, dst):
+          if layout:
+              x, y = positions[node]
+              net.add_node(node, node, title=node, x=x, y=y)
+          else:
+              net.add_node(node, node, title=node)
       net.add_edge(src, dst, value=w)
 
   neighbor_map = net.get_adj_list()
@@ -98,63 +103,64 @@ def plot_graph_pyVis(df, output_file):
           '<br>'.join(neighbor_map[node['id']])
       node['value'] = len(neighbor_map[node['id']])
 
-  net.show_buttons(filter_=['physics'])
+  if not layout:
+      # The physics controls would restart the simulation and undo a precomputed layout
+      net.show_buttons(filter_=['physics'])
   net.show(output_file)
 
 
-def get_top_followers(df_or_filename, k=15, common_followers_with="Ibai"):
+def get_top_followers(df_or_filename, k=15, common_followers_with="Ibai", output="pandas"):
     '''
     Returns a dataframe with the top k followers of a given user in the network of Twitch streamers.
 
+    The edges are the follows of the streamer to its first k follows (whose follows are known) and the
+    follows among them, all of them taken at once from the follows of those k streamers.
+
     Args:
-        df_or_filename: dataframe or path to the dataframe file with the network of streamers
+        df_or_filename: dataframe or path to the dataframe file with the network of streamers. If it is a path,
+            the edges are read from its graph index (see `load_graph_index`) and the follows are taken by id.
         k: number of top followers to return
         common_followers_with: name of the user to get the top followers of
+        output: "pandas" to return a dataframe with the columns source, target and edge_weigth,
+            "numpy" to return them as a dict of arrays or "arrow" to return them as a pyarrow Table
     '''
 
     if isinstance(df_or_filename, str):
-        if df_or_filename.endswith("csv"):
-            df = pd.read_csv(df_or_filename, lineterminator='\n')
-        elif df_or_filename.endswith("feather"):
-            df = pd.read_feather(df_or_filename)
+        graph, cofollow = load_graph_index(df_or_filename), load_cofollow_index(df_or_filename)
+        names, node = cofollow.names, cofollow.node_of(common_followers_with)
+        follows = np.asarray(graph.out_neighbors(node))
+        # The first k follows (whose follows are known) in the order of the dataset, like the dataframe
+        follows = follows[np.asarray(graph.has_follows)[follows]]
+        follows = follows[np.argsort(np.asarray(graph.positions)[follows], kind="stable")][:k]
+        sources, targets = graph.subgraph_edges(follows)
+        follows_names, source_names, target_names = names[follows], names[sources], names[targets]
     else:
-        df = df_or_filename
-
-    follows_of_user = df.loc[df.name.str.lower() == common_followers_with.lower()].iloc[0]["user_follows"]
-
-    df = df.loc[df['id'].isin(follows_of_user)]
-
-    df = df.dropna(how='any',
-                            subset=['user_follows'])
-
-    df = df[:k] if k < len(df) else df
-
-    id_names = dict(zip(df["id"], df["name"].values.tolist()))
-
-    df["followers_id"] = [list(set(df["id"]).intersection(
-        df["user_follows"].values[i])) for i in range(len(df))]
-
-    def double(j):
-      return id_names[j]
-
-    df["followers_name"] = df["followers_id"].apply(
-        lambda x: list(map(double, x)))
-
-    df = df[['name', "followers_name"]]
-
-    df2 = pd.DataFrame({
-        "source": [common_followers_with]*len(df),
-        "target": df["name"],
-        "edge_weigth": 1,
-
-    })
-
-    for row in df.iterrows():
-      for j in row[1].followers_name:
-          newrow = {'source': row[1].values[0], 'target': j, 'edge_weigth': 1}
-          df2 = pd.concat([df2, pd.DataFrame(newrow, index=[0])], ignore_index=True).reset_index(drop=True)
-
-    return df2
+        # Datasets of previous versions of the pipeline stored the ids (and follows) as strings
+        df = df_or_filename.assign(id=lambda x: pd.to_numeric(x["id"]).astype("int64"))
+        follows_of_user = _parse_follows(df.loc[df.name.str.lower() == common_followers_with.lower()].iloc[0]["user_follows"])
+        follows_of_user = [] if follows_of_user is None else follows_of_user
+        df = df.loc[df['id'].isin(follows_of_user)].dropna(how='any', subset=['user_follows'])
+        df = df.drop_duplicates(subset=["id"]).head(k)
+        ids, follows_names = df["id"].to_numpy(), df["name"].to_numpy()
+        follows = follows_to_arrow(df["user_follows"])
+        # (row of the follower, id followed) of every follow of the k streamers that is one of them
+        rows = np.repeat(np.arange(len(df)), np.diff(follows.offsets.to_numpy()))
+        followed = follows.flatten().to_numpy()
+        inside = np.isin(followed, ids)
+        edges = np.unique(np.stack([rows[inside], np.searchsorted(np.sort(ids), followed[inside])]), axis=1)
+        source_names = follows_names[edges[0]]
+        target_names = follows_names[np.argsort(ids)][edges[1]]
+
+    edges = {
+        "source": np.concatenate([np.full(len(follows_names), common_followers_with, dtype=object), source_names]),
+        "target": np.concatenate([follows_names, target_names]).astype(object),
+    }
+    edges["edge_weigth"] = np.ones(len(edges["source"]), dtype=np.int64)
+    if output == "numpy":
+        return edges
+    if output == "arrow":
+        return pa.table(edges)
+    return pd.DataFrame(edges)
 
 
 def networkx_centrality_measures(df):
@@ -192,7 +198,7 @@ def draw_graph(G,title=None):
   plt.title(title)
   plt.show()
 
-def from_pandas_to_pyviz_net(df,height="600px",width="600px", emphasize_node=None):
+def from_pandas_to_pyviz_net(df,height="600px",width="600px", emphasize_node=None, layout=True):
     # Create networkx graph object from pandas dataframe
     G = nx.from_pandas_edgelist(df, edge_attr = True)
 
@@ -203,6 +209,12 @@ def from_pandas_to_pyviz_net(df,height="600px",width="600px", emphasize_node=Non
             # else:
             #     G.nodes[node]["color"] = "red"
 
+    if layout:
+        # Compute the positions of the nodes here instead of simulating the physics in the browser
+        positions = get_layout(G.nodes, df.iloc[:, 0], df.iloc[:, 1], scale=layout_scale(G.number_of_nodes()))
+        for node, (x, y) in positions.items():
+            G.nodes[node]["x"], G.nodes[node]["y"] = x, y
+
     # Initiate PyVis network object
     streamer_net = Network(
                        height= height,
@@ -215,13 +227,15 @@ def from_pandas_to_pyviz_net(df,height="600px",width="600px", emphasize_node=Non
     # Take Networkx graph and translate it to a PyVis graph format
     streamer_net.from_nx(G)
 
-    # Generate network with specific layout settings
-    streamer_net.repulsion(
-                        node_distance=420,
-                        central_gravity=0.33,
-                        spring_length=110,
-                        spring_strength=0.10,
-                        damping=0.95
-                       )
+    if layout:
+        streamer_net.toggle_physics(False)
+    else:
+        # Generate network with specific layout settings
+        streamer_net.repulsion(
+                            node_distance=420,
+                            central_gravity=0.33,
+                            spring_length=110,
+                            spring_strength=0.10,
+                            damping=0.95
+                           )
     return streamer_net
-
@@ -0,0 +1,95 @@
+import os, hashlib, logging
+from collections import OrderedDict
+import numpy as np
+
+logger = logging.getLogger(os.path.basename(__name__).split(".")[-1])
+
+# Layouts already computed by this process, by the hash of their graph
+LAYOUT_CACHE_SIZE = 512
+_layouts = OrderedDict()
+
+
+def spring_layout(n, sources, targets, weights=None, iterations=50, seed=0, scale=1.0):
+    """
+    Returns the positions (an array of shape (n, 2) within [-scale, scale]) of the nodes of a graph with
+    the Fruchterman-Reingold force-directed algorithm, with all the forces of an iteration computed at once:
+    the repulsion between every pair of nodes as a dense matrix and the attraction along the edges.
+    The direction of the edges is ignored.
+
+    Parameters
+    ----------
+    n : int
+        The number of nodes.
+    sources, targets : np.ndarray
+        The nodes (from 0 to n-1) at both ends of each edge.
+    weights : np.ndarray
+        The weight of each edge (1 by default).
+    iterations : int
+        The number of iterations.
+    seed : int
+        The seed of the initial (random) positions, so the same graph always gets the same layout.
+    scale : float
+        The positions are rescaled to [-scale, scale].
+    """
+    if n == 0:
+        return np.zeros((0, 2))
+    if n == 1:
+        return np.zeros((1, 2))
+    sources, targets = np.asarray(sources, dtype=np.int64), np.asarray(targets, dtype=np.int64)
+    weights = np.ones(len(sources)) if weights is None else np.asarray(weights, dtype=np.float64)
+    adjacency = np.zeros((n, n))
+    np.add.at(adjacency, (sources, targets), weights)
+    adjacency = adjacency + adjacency.T
+    pos = np.random.default_rng(seed).random((n, 2))
+    # Optimal distance between nodes
+    k = np.sqrt(1.0 / n)
+    # The temperature limits the displacement of the nodes and cools down linearly
+    t = max(np.ptp(pos, axis=0).max(), 1) * 0.1
+    dt = t / (iterations + 1)
+    for _ in range(iterations):
+        squared_norms = (pos ** 2).sum(axis=1)
+        distance = np.sqrt((squared_norms[:, None] + squared_norms[None, :] - 2 * pos @ pos.T).clip(min=0)).clip(min=0.01)
+        # Repulsion k^2/d between all the pairs and attraction d^2/k along the edges (along the unit vector between them)
+        force = k * k / distance ** 2 - adjacency * distance / k
+        # sum_j force[i, j] * (pos[i] - pos[j])
+        displacement = pos * force.sum(axis=1)[:, None] - force @ pos
+        length = np.linalg.norm(displacement, axis=-1).clip(min=0.01)
+        pos += displacement * (t / length)[:, None]
+        t -= dt
+    pos -= pos.mean(axis=0)
+    max_abs = np.abs(pos).max()
+    return pos * (scale / max_abs) if max_abs > 0 else pos
+
+
+def get_layout(nodes, sources, targets, weights=None, scale=1.0):
+    """
+    Returns a dict {node: (x, y)} with the `spring_layout` of the graph with the given {nodes} and edges
+    (sources[i], targets[i]) given as node labels. The layouts are cached in memory by their graph, so the
+    layout of a graph is only computed once per process.
+    """
+    nodes = list(nodes)
+    index = {node: i for i, node in enumerate(nodes)}
+    sources = np.array([index[node] for node in sources], dtype=np.int64)
+    targets = np.array([index[node] for node in targets], dtype=np.int64)
+    weights = None if weights is None else np.asarray(weights, dtype=np.float64)
+    digest = hashlib.sha256(repr((nodes, scale)).encode())
+    for array in [sources, targets] + ([] if weights is None else [weights]):
+        digest.update(array.tobytes())
+    key = digest.hexdigest()
+    if key in _layouts:
+        _layouts.move_to_end(key)
+        return _layouts[key]
+    pos = spring_layout(len(nodes), sources, targets, weights, scale=scale)
+    layout = {node: (float(x), float(y)) for node, (x, y) in zip(nodes, pos)}
+    _layouts[key] = layout
+    if len(_layouts) > LAYOUT_CACHE_SIZE:
+        _layouts.popitem(last=False)
+    return layout
+
+
+def layout_scale(n_nodes):
+    """
+    Returns the scale (in pixels) of the layout of a graph with {n_nodes} shown in the dashboard, so that
+    bigger graphs are spread over a larger area.
+    """
+    return 150 * np.sqrt(max(n_nodes, 1))
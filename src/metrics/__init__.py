@@ -0,0 +1,5 @@
+from .fundamental import FUNDAMENTAL_METRICS, compute_fundamental_metrics, save_fundamental_metrics
+from .fundamental import degree_centrality, pagerank, core_number, shortest_path_centrality
+from .parallel import parallel_shortest_path_centrality, sampling_error_bound
+from .rank_table import RankTable, load_rank_table, build_rank_table
+from .incremental import update_fundamental_metrics, update_core_number, update_metrics_from_deltas
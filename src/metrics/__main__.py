@@ -0,0 +1,77 @@
+from .fundamental import FUNDAMENTAL_METRICS, compute_fundamental_metrics, save_fundamental_metrics
+from .parallel import sampling_error_bound
+from .rank_table import build_rank_table, load_rank_table
+from .incremental import update_metrics_from_deltas, write_state
+from ..graph_index import load_graph_index
+from ..data.refresh import EdgeDeltaLog, get_delta_log_path
+from ..user import User
+import logging, os, time
+import click
+
+
+# Set the logger format to show the name, time in minutes, and message
+logging.basicConfig(
+    format='%(asctime)s - %(name)s.%(funcName)s - %(levelname)s: %(message)s',
+    datefmt='%b %d %H:%M',
+    level=logging.INFO
+)
+logger = logging.getLogger(os.path.basename(__name__).split(".")[-1])
+
+"""
+Compute the fundamental network metrics of the streamers of a dataset and save them to data/fundamental_metrics
+
+Usage:
+----------
+```
+python -m src.metrics --input_file "data/streamers.parquet"
+python -m src.metrics --input_file "data/streamers.parquet" --samples 1000 --seed 0
+python -m src.metrics --input_file "data/streamers.parquet" --n_jobs 8
+python -m src.metrics --input_file "data/streamers.parquet" -m pagerank -m nx_cores
+python -m src.metrics --input_file "data/streamers.parquet" --incremental
+```
+
+With --incremental, the metrics already in --output_dir are updated with the changes of the follows logged by the last
+refreshes of the dataset (python -m src.data --refresh) instead of being computed from scratch: the degrees exactly,
+the PageRank starting from the previous one and the core numbers locally. The betweenness and closeness are kept.
+"""
+
+@click.command()
+@click.option("-i", "--input_file", type=click.Path(exists=True), default="data/streamers.parquet", help="The dataset of streamers")
+@click.option("-o", "--output_dir", type=click.Path(), default="data/fundamental_metrics", help="The directory where the metrics are saved (one pickle each)")
+@click.option("-m", "--metrics", type=click.Choice(FUNDAMENTAL_METRICS), multiple=True, default=FUNDAMENTAL_METRICS,
+    help="The metrics to compute (all of them by default)")
+@click.option("-k", "--samples", type=int, default=None,
+    help="Estimate the betweenness and closeness from the shortest paths of this number of random nodes instead of all of them")
+@click.option("--seed", type=int, default=None, help="The seed of the sampling of nodes")
+@click.option("--delta", type=float, default=0.05, help="The error bound of the sampled betweenness holds with probability 1-delta")
+@click.option("-j", "--n_jobs", type=int, default=None, help="The number of processes used for the betweenness and closeness (all the CPUs by default)")
+@click.option("--incremental", is_flag=True, default=False,
+    help="Update the metrics in output_dir with the changes of the follows logged since they were computed")
+@click.option("--delta_log", type=click.Path(), default=None,
+    help="The log of the changes of the follows (the one of the dataset by default, e.g. data/streamers.deltas.jsonl)")
+def main(input_file=None, output_dir=None, metrics=None, samples=None, seed=None, delta=0.05, n_jobs=None,
+    incremental=False, delta_log=None):
+    start = time.time()
+    User.use_follows_dataset(input_file)
+    graph = load_graph_index(input_file)
+    if incremental:
+        log = EdgeDeltaLog(delta_log or get_delta_log_path(input_file))
+        values, deltas_until = update_metrics_from_deltas(graph, load_rank_table(output_dir), log, output_dir)
+        save_fundamental_metrics(graph, values, output_dir)
+        build_rank_table(output_dir)
+        write_state(output_dir, deltas_until)
+        logger.info(f"Done in {time.time()-start:.1f}s")
+        return
+    logger.info(f"Computing {', '.join(metrics)} of {graph.n_nodes} streamers ({graph.n_edges} follows)...")
+    values = compute_fundamental_metrics(graph, metrics=list(metrics), k=samples, seed=seed, n_jobs=n_jobs)
+    if samples and ("betweenness" in metrics or "closeness" in metrics):
+        logger.info(f"The sampled betweenness is within {sampling_error_bound(graph.n_nodes, samples, delta):.4f} "\
+            f"of the exact one for all the streamers with probability {1-delta}")
+    save_fundamental_metrics(graph, values, output_dir)
+    build_rank_table(output_dir)
+    # The changes of the follows logged until now are already in the metrics
+    write_state(output_dir, time.time())
+    logger.info(f"Done in {time.time()-start:.1f}s")
+
+if __name__ == "__main__":
+    main()
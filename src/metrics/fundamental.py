@@ -0,0 +1,293 @@
+import os, pickle, heapq, logging
+import numpy as np
+import scipy.sparse as sp
+
+logger = logging.getLogger(os.path.basename(__name__).split(".")[-1])
+
+# Metrics stored in data/fundamental_metrics (one pickle each)
+FUNDAMENTAL_METRICS = ["indegree", "outdegree", "closeness", "betweenness", "pagerank", "nx_cores"]
+
+
+def degree_centrality(graph):
+    """
+    Returns the in-degree and out-degree centralities of the nodes of the GraphIndex {graph}
+    (the degree divided by n-1, as `nx.in_degree_centrality` and `nx.out_degree_centrality`).
+    """
+    scale = 1 / (graph.n_nodes - 1) if graph.n_nodes > 1 else 1
+    in_degree = np.bincount(graph.out_indices, minlength=graph.n_nodes)
+    out_degree = np.diff(graph.out_indptr)
+    return in_degree * scale, out_degree * scale
+
+
+def pagerank(graph, alpha=0.85, max_iter=100, tol=1.0e-6, x0=None):
+    """
+    Returns the PageRank of the nodes of the GraphIndex {graph} computed with the power iteration
+    over its sparse adjacency matrix. The mass of the nodes without follows is spread uniformly
+    and the stopping criterion is the same as in `nx.pagerank`.
+
+    Parameters
+    ----------
+    graph : GraphIndex
+        The graph of follows.
+    alpha : float
+        The damping factor.
+    max_iter : int
+        The maximum number of iterations.
+    tol : float
+        The iteration stops when the l1 change of the ranks is below n * {tol}.
+    x0 : np.ndarray
+        The initial ranks (e.g. those of the graph before some edges changed). Uniform by default.
+    """
+    n = graph.n_nodes
+    if n == 0:
+        return np.zeros(0)
+    A = graph.to_scipy()
+    out_degree = np.diff(graph.out_indptr).astype(np.float64)
+    dangling = out_degree == 0
+    inv_out_degree = np.divide(1.0, out_degree, out=np.zeros(n), where=~dangling)
+    AT = A.T.tocsr()
+    x = np.full(n, 1.0 / n) if x0 is None else np.asarray(x0, dtype=np.float64) / np.sum(x0)
+    for i in range(max_iter):
+        x_last = x
+        x = alpha * (AT @ (x_last * inv_out_degree) + x_last[dangling].sum() / n) + (1 - alpha) / n
+        err = np.abs(x - x_last).sum()
+        if err < n * tol:
+            logger.info(f"PageRank converged after {i+1} iterations")
+            return x
+    logger.warning(f"PageRank did not converge after {max_iter} iterations (error {err})")
+    return x
+
+
+def core_number(graph):
+    """
+    Returns the core number of the nodes of the GraphIndex {graph} using the total degree
+    (in + out, as `nx.core_number` does on a DiGraph) and ignoring self-follows.
+
+    The nodes are peeled in order of degree with a bucket queue (as in Batagelj and Zaversnik), a batch at a time:
+    all the nodes whose remaining degree is at most k are removed at once and only their neighbors are updated
+    and moved to the bucket of their new degree (or peeled in the same level if it drops to k). Every edge is
+    visited once, when the first of its ends is peeled, and every node enters a bucket once per batch it is touched.
+    """
+    n = graph.n_nodes
+    A = graph.to_scipy()
+    A = (A - sp.diags(A.diagonal())).tocsr()
+    A.eliminate_zeros()
+    # Followed and followers in the same matrix: a reciprocal follow counts twice, like in networkx
+    S = (A + A.T).tocsr()
+    degree = np.asarray(S.sum(axis=1)).ravel().astype(np.int64)
+    core = np.zeros(n, dtype=np.int64)
+    removed = np.zeros(n, dtype=bool)
+    # Nodes by the degree they had when they were put in the bucket (they are skipped if it changed since)
+    buckets = {}
+    levels = []
+
+    def push(nodes):
+        nodes = nodes[np.argsort(degree[nodes], kind="stable")]
+        keys, starts = np.unique(degree[nodes], return_index=True)
+        ends = np.append(starts[1:], len(nodes))
+        for key, start, end in zip(keys.tolist(), starts.tolist(), ends.tolist()):
+            if key not in buckets:
+                buckets[key] = []
+                heapq.heappush(levels, key)
+            buckets[key].append(nodes[start:end])
+
+    push(np.arange(n))
+    while levels:
+        k = heapq.heappop(levels)
+        peel = np.concatenate(buckets.pop(k))
+        peel = peel[~removed[peel] & (degree[peel] == k)]
+        while peel.size:
+            core[peel] = k
+            removed[peel] = True
+            # Positions in S of the connections of the peeled nodes
+            starts, counts = S.indptr[peel], S.indptr[peel + 1] - S.indptr[peel]
+            positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            if positions.size > n // 8:
+                # Large batches are aggregated over all the nodes, which costs less than the edges visited
+                decrease = np.bincount(S.indices[positions], weights=S.data[positions], minlength=n).astype(np.int64)
+                touched = np.flatnonzero(decrease)
+                decrease = decrease[touched]
+            else:
+                touched, inverse = np.unique(S.indices[positions], return_inverse=True)
+                decrease = np.bincount(inverse, weights=S.data[positions]).astype(np.int64)
+            alive = ~removed[touched]
+            touched, decrease = touched[alive], decrease[alive]
+            degree[touched] -= decrease
+            low = degree[touched] <= k
+            if not low.all():
+                push(touched[~low])
+            peel = touched[low]
+    return core
+
+
+def _single_source_paths(indptr, indices, source, n):
+    """
+    Breadth-first search from {source} over the CSR graph (indptr, indices) with every level expanded at once.
+    Returns the distance of each node to the source (-1 if unreachable), the number of shortest paths
+    from the source to each node (sigma) and the (parent, child) edges of the shortest paths of each level.
+    """
+    dist = np.full(n, -1, dtype=np.int64)
+    sigma = np.zeros(n)
+    dist[source], sigma[source] = 0, 1
+    frontier = np.array([source])
+    level_edges = []
+    d = 0
+    while frontier.size:
+        starts, counts = indptr[frontier], indptr[frontier + 1] - indptr[frontier]
+        total = counts.sum()
+        if total == 0:
+            break
+        # positions in indices of the edges of all the nodes of the frontier
+        positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+        children = indices[positions]
+        parents = np.repeat(frontier, counts)
+        unvisited = dist[children] == -1
+        frontier = np.unique(children[unvisited])
+        dist[frontier] = d + 1
+        on_path = dist[children] == d + 1
+        parents, children = parents[on_path], children[on_path]
+        np.add.at(sigma, children, sigma[parents])
+        level_edges.append((parents, children))
+        d += 1
+    return dist, sigma, level_edges
+
+
+def accumulate_paths(indptr, indices, sources, n):
+    """
+    Runs a breadth-first search from each of the {sources} and accumulates the betweenness dependencies
+    (Brandes' algorithm) and the incoming distances of every node.
+
+    Returns
+    -------
+    betweenness : np.ndarray
+        The (unnormalized) sum of the dependencies of each node over the sources.
+    total_dist : np.ndarray
+        The sum of the distances from the sources that reach each node.
+    reached_by : np.ndarray
+        The number of sources (other than itself) that reach each node.
+    """
+    betweenness = np.zeros(n)
+    total_dist = np.zeros(n)
+    reached_by = np.zeros(n)
+    for source in sources:
+        dist, sigma, level_edges = _single_source_paths(indptr, indices, source, n)
+        delta = np.zeros(n)
+        for parents, children in reversed(level_edges):
+            np.add.at(delta, parents, sigma[parents] / sigma[children] * (1 + delta[children]))
+        delta[source] = 0
+        betweenness += delta
+        reached = dist > 0
+        total_dist[reached] += dist[reached]
+        reached_by[reached] += 1
+    return betweenness, total_dist, reached_by
+
+
+def sample_sources(n, k=None, seed=None):
+    """
+    Returns the nodes used as sources of the shortest paths: all of them if {k} is None or k >= n,
+    or {k} of them taken uniformly at random otherwise.
+    """
+    if k is None or k >= n:
+        return np.arange(n)
+    return np.sort(np.random.default_rng(seed).choice(n, size=k, replace=False))
+
+
+def finalize_paths(n, n_sources, betweenness, total_dist, reached_by):
+    """
+    Scales the accumulated sums of `accumulate_paths` over {n_sources} sources (estimating the sums over all the nodes
+    if they were sampled) into the betweenness (normalized by 1/((n-1)(n-2)), as `nx.betweenness_centrality`)
+    and the closeness (from the incoming distances with the Wasserman and Faust correction, as `nx.closeness_centrality`).
+    """
+    scale = n / n_sources if n_sources else 0
+    betweenness = betweenness * scale
+    if n > 2:
+        betweenness /= (n - 1) * (n - 2)
+    reached_by, total_dist = reached_by * scale, total_dist * scale
+    closeness = np.zeros(n)
+    has_paths = total_dist > 0
+    if n > 1:
+        closeness[has_paths] = reached_by[has_paths] ** 2 / (total_dist[has_paths] * (n - 1))
+    return betweenness, closeness
+
+
+def shortest_path_centrality(graph, k=None, seed=None):
+    """
+    Returns the betweenness and closeness centralities of the nodes of the GraphIndex {graph}.
+    Both come from the same breadth-first searches, one per source node.
+
+    Parameters
+    ----------
+    graph : GraphIndex
+        The graph of follows.
+    k : int
+        If given, only {k} source nodes taken at random are used and the centralities are estimated
+        from them. The error of the estimation decreases as 1/sqrt(k). If None, they are exact.
+    seed : int
+        The seed of the sampling of the sources.
+    """
+    n = graph.n_nodes
+    sources = sample_sources(n, k, seed)
+    logger.info(f"Computing the shortest paths from {len(sources)}/{n} nodes...")
+    sums = accumulate_paths(np.asarray(graph.out_indptr), np.asarray(graph.out_indices), sources, n)
+    return finalize_paths(n, len(sources), *sums)
+
+
+def compute_fundamental_metrics(graph, metrics=None, k=None, seed=None, n_jobs=1):
+    """
+    Computes the fundamental metrics of the nodes of the GraphIndex {graph} and returns a dict with
+    an array of values (one per node) for each metric.
+
+    Parameters
+    ----------
+    graph : GraphIndex
+        The graph of follows.
+    metrics : list
+        The metrics to compute (those of FUNDAMENTAL_METRICS by default).
+    k : int
+        The number of sources used to estimate the betweenness and closeness (see `shortest_path_centrality`).
+    seed : int
+        The seed of the sampling of the sources.
+    n_jobs : int
+        The number of processes the betweenness and closeness are computed with (see `parallel_shortest_path_centrality`).
+        None uses all the CPUs.
+    """
+    metrics = FUNDAMENTAL_METRICS if metrics is None else metrics
+    unknown = set(metrics) - set(FUNDAMENTAL_METRICS)
+    if unknown:
+        raise ValueError(f"Unknown metrics {unknown}. Use some of {FUNDAMENTAL_METRICS}")
+    values = {}
+    if "indegree" in metrics or "outdegree" in metrics:
+        values["indegree"], values["outdegree"] = degree_centrality(graph)
+    if "pagerank" in metrics:
+        values["pagerank"] = pagerank(graph)
+    if "nx_cores" in metrics:
+        values["nx_cores"] = core_number(graph)
+    if "betweenness" in metrics or "closeness" in metrics:
+        if n_jobs == 1:
+            values["betweenness"], values["closeness"] = shortest_path_centrality(graph, k=k, seed=seed)
+        else:
+            from .parallel import parallel_shortest_path_centrality
+            values["betweenness"], values["closeness"] = parallel_shortest_path_centrality(graph, k=k, seed=seed, n_jobs=n_jobs)
+    return {m: values[m] for m in metrics}
+
+
+def to_ranking(graph, values):
+    """
+    Returns a dict {id (as a string): value} of the nodes of the GraphIndex {graph} sorted by descending value,
+    which is the format of the metrics in data/fundamental_metrics (its key order is the ranking).
+    """
+    order = np.argsort(-np.asarray(values), kind="stable")
+    ids = np.asarray(graph.ids)[order].astype(str)
+    return dict(zip(ids.tolist(), np.asarray(values)[order].tolist()))
+
+
+def save_fundamental_metrics(graph, values, output_dir="data/fundamental_metrics"):
+    """
+    Saves each of the metrics in {values} (as returned by `compute_fundamental_metrics`) as a ranking
+    in {output_dir}/{metric}.pkl.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    for metric, metric_values in values.items():
+        with open(os.path.join(output_dir, f"{metric}.pkl"), "wb") as f:
+            pickle.dump(to_ranking(graph, metric_values), f)
+        logger.info(f"{metric} saved to {output_dir}/{metric}.pkl")
@@ -0,0 +1,237 @@
+import os, json, time, logging
+from collections import defaultdict
+import numpy as np
+import scipy.sparse as sp
+
+from .fundamental import pagerank, core_number, FUNDAMENTAL_METRICS
+
+logger = logging.getLogger(os.path.basename(__name__).split(".")[-1])
+
+# File (in the directory of the metrics) with the time until which the edge deltas are already in the metrics
+STATE_FILE = "incremental_state.json"
+
+
+def read_state(metrics_dir):
+    path = os.path.join(metrics_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_state(metrics_dir, deltas_until):
+    with open(os.path.join(metrics_dir, STATE_FILE), "w") as f:
+        json.dump({"deltas_until": deltas_until}, f)
+
+
+def net_edge_changes(graph, records):
+    """
+    Returns the edges (as node ids of the GraphIndex {graph}) that were effectively added and removed by the
+    records of an EdgeDeltaLog, in chronological order. An edge added and removed again in the same batch is
+    not a change, and the follows of or to users that are not in the graph are ignored.
+    """
+    first_op, last_op = {}, {}
+    for record in sorted(records, key=lambda record: record["fetched_at"]):
+        source = record["id"]
+        for op in ("added", "removed"):
+            for target in record[op]:
+                first_op.setdefault((source, target), op)
+                last_op[(source, target)] = op
+    changes = {"added": [], "removed": []}
+    for pair, op in last_op.items():
+        # The edge was in the old graph if it was first removed and is in the new one if it was last added
+        was_in, is_in = first_op[pair] == "removed", op == "added"
+        if was_in != is_in:
+            changes[op].append(pair)
+    result = []
+    for op in ("added", "removed"):
+        pairs = np.array(changes[op], dtype=np.int64).reshape(-1, 2)
+        nodes = graph.node_of(pairs)
+        result.append(nodes[(nodes >= 0).all(axis=1)])
+    return result
+
+
+class _WorkLimitExceeded(Exception):
+    pass
+
+
+class _DynamicGraph:
+    """
+    Symmetric multigraph (a follow in either direction counts as one connection, a reciprocal one as two,
+    like the total degree of a DiGraph in networkx) made of a CSR base and a small overlay of changes.
+    It counts the connections visited and raises _WorkLimitExceeded after {max_work} of them.
+    """
+
+    def __init__(self, S, max_work=None):
+        self.S = S
+        self.overlay = defaultdict(lambda: defaultdict(int))
+        self.max_work = max_work
+        self.work = 0
+
+    def add(self, u, v, count):
+        if u == v:
+            return
+        self.overlay[u][v] += count
+        self.overlay[v][u] += count
+
+    def neighbors(self, u):
+        start, end = self.S.indptr[u], self.S.indptr[u + 1]
+        self.work += end - start
+        if self.max_work is not None and self.work > self.max_work:
+            raise _WorkLimitExceeded()
+        counts = dict(zip(self.S.indices[start:end].tolist(), self.S.data[start:end].tolist()))
+        for v, count in self.overlay.get(u, {}).items():
+            counts[v] = counts.get(v, 0) + count
+        return [(v, int(count)) for v, count in counts.items() if count > 0]
+
+
+def _subcore(graph, core, roots, k):
+    """
+    Returns the nodes with core number {k} that are reachable from the {roots} through nodes with core number {k}.
+    """
+    visited, stack = set(roots), list(roots)
+    while stack:
+        for v, _ in graph.neighbors(stack.pop()):
+            if core[v] == k and v not in visited:
+                visited.add(v)
+                stack.append(v)
+    return visited
+
+
+def _core_degrees(graph, core, nodes, k):
+    """
+    Returns the number of connections of each of the {nodes} with nodes of core number at least {k}.
+    """
+    return {u: sum(count for v, count in graph.neighbors(u) if core[v] >= k) for u in nodes}
+
+
+def _insert_edge(graph, core, u, v):
+    graph.add(u, v, 1)
+    if u == v:
+        return
+    k = min(core[u], core[v])
+    subcore = _subcore(graph, core, [w for w in (u, v) if core[w] == k], k)
+    degrees = _core_degrees(graph, core, subcore, k)
+    # The nodes that cannot be in the (k+1)-core are evicted, the rest increase their core number by 1
+    evicted, queue = set(), [w for w in subcore if degrees[w] <= k]
+    while queue:
+        w = queue.pop()
+        if w in evicted:
+            continue
+        evicted.add(w)
+        for x, count in graph.neighbors(w):
+            if x in subcore and x not in evicted:
+                degrees[x] -= count
+                if degrees[x] <= k:
+                    queue.append(x)
+    for w in subcore - evicted:
+        core[w] = k + 1
+
+
+def _remove_edge(graph, core, u, v):
+    graph.add(u, v, -1)
+    if u == v:
+        return
+    k = min(core[u], core[v])
+    subcore = _subcore(graph, core, [w for w in (u, v) if core[w] == k], k)
+    degrees = _core_degrees(graph, core, subcore, k)
+    # The nodes that are not in the k-core anymore decrease their core number by 1
+    queue = [w for w in subcore if degrees[w] < k]
+    while queue:
+        w = queue.pop()
+        if core[w] != k:
+            continue
+        core[w] = k - 1
+        for x, count in graph.neighbors(w):
+            if x in subcore and core[x] == k:
+                degrees[x] -= count
+                if degrees[x] < k:
+                    queue.append(x)
+
+
+def update_core_number(graph, core, added, removed, max_work=0.05):
+    """
+    Returns the core numbers of the nodes of the GraphIndex {graph} (which already has the changes) from the
+    core numbers {core} of the graph before the edges {added} were added and the edges {removed} removed.
+    Every change only visits the nodes around it that have the core number of its endpoints (traversal algorithm).
+    The traversals run in Python, so once they have visited more than a fraction {max_work} of the connections
+    of the graph the core numbers are computed from scratch with `core_number` instead, which is faster.
+    """
+    A = graph.to_scipy()
+    A = (A - sp.diags(A.diagonal())).tocsr()
+    A.eliminate_zeros()
+    S = (A + A.T).tocsr()
+    dynamic = _DynamicGraph(S, max_work=int(max_work * S.nnz))
+    # Start from the graph before the changes and apply them one by one
+    for u, v in added:
+        dynamic.add(u, v, -1)
+    for u, v in removed:
+        dynamic.add(u, v, 1)
+    core = np.array(core, dtype=np.int64)
+    try:
+        for u, v in removed:
+            _remove_edge(dynamic, core, u, v)
+        for u, v in added:
+            _insert_edge(dynamic, core, u, v)
+    except _WorkLimitExceeded:
+        logger.info("The changes affect a large part of the graph, computing the core numbers from scratch...")
+        return core_number(graph)
+    logger.info(f"The core numbers were updated visiting {dynamic.work}/{S.nnz} connections")
+    return core
+
+
+def update_fundamental_metrics(graph, values, added, removed):
+    """
+    Updates the fundamental metrics of the nodes of the GraphIndex {graph} (which already has the changes) after
+    the edges {added} and {removed} (arrays of (source, target) nodes) changed, and returns them in a new dict:
+
+    - the in-degree and out-degree centralities are updated exactly with the changes of each node,
+    - the PageRank is computed again starting from the previous one, which converges in a few iterations,
+    - the core numbers are updated locally around the changed edges (see `update_core_number`),
+    - the betweenness and closeness are not updated (they need all the shortest paths).
+
+    Parameters
+    ----------
+    graph : GraphIndex
+        The graph of follows after the changes.
+    values : dict
+        The previous values of each metric (one per node of {graph}).
+    added, removed : np.ndarray
+        The edges added and removed, as arrays of shape (n, 2) of node ids.
+    """
+    n = graph.n_nodes
+    scale = n - 1 if n > 1 else 1
+    values = dict(values)
+    if "indegree" in values:
+        in_degree = np.rint(np.asarray(values["indegree"]) * scale).astype(np.int64)
+        in_degree += np.bincount(added[:, 1], minlength=n) - np.bincount(removed[:, 1], minlength=n)
+        values["indegree"] = in_degree / scale
+    if "outdegree" in values:
+        out_degree = np.rint(np.asarray(values["outdegree"]) * scale).astype(np.int64)
+        out_degree += np.bincount(added[:, 0], minlength=n) - np.bincount(removed[:, 0], minlength=n)
+        values["outdegree"] = out_degree / scale
+    if "pagerank" in values:
+        values["pagerank"] = pagerank(graph, x0=values["pagerank"])
+    if "nx_cores" in values:
+        values["nx_cores"] = update_core_number(graph, values["nx_cores"], added, removed)
+    return values
+
+
+def update_metrics_from_deltas(graph, rank_table, delta_log, metrics_dir):
+    """
+    Applies to the metrics of the RankTable {rank_table} the changes of the EdgeDeltaLog {delta_log} that are not in them
+    yet and returns the updated values of all the metrics (as `compute_fundamental_metrics` does), together with the time
+    of the last change applied. The nodes of the graph must be the same as those of the table.
+    """
+    if len(rank_table) != graph.n_nodes or not np.array_equal(np.asarray(rank_table.ids), np.asarray(graph.ids)):
+        raise ValueError("The streamers of the dataset changed since the metrics were computed. Compute them again from scratch")
+    since = read_state(metrics_dir).get("deltas_until")
+    records = delta_log.read(since)
+    added, removed = net_edge_changes(graph, records)
+    logger.info(f"Updating the metrics with {len(added)} added and {len(removed)} removed follows ({len(records)} records of {delta_log.path})")
+    start = time.time()
+    values = {metric: np.array(rank_table.values(metric)) for metric in FUNDAMENTAL_METRICS if metric in rank_table.metrics}
+    values = update_fundamental_metrics(graph, values, added, removed)
+    logger.info(f"The metrics were updated in {time.time()-start:.2f}s. The betweenness and closeness were kept")
+    deltas_until = max([record["fetched_at"] for record in records], default=since)
+    return values, deltas_until
@@ -0,0 +1,94 @@
+import os, logging
+import numpy as np
+from multiprocessing import Pool, shared_memory
+
+from .fundamental import accumulate_paths, sample_sources, finalize_paths
+
+logger = logging.getLogger(os.path.basename(__name__).split(".")[-1])
+
+# CSR arrays of the graph attached by each worker of the pool
+_worker_graph = {}
+
+
+def _share_array(array):
+    """
+    Copies {array} into a new block of shared memory and returns the block and the array backed by it.
+    """
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+    shared[:] = array
+    return block, shared
+
+
+def _attach_graph(n, specs):
+    """
+    Initializer of the workers: attaches to the shared memory blocks of the CSR arrays.
+    """
+    _worker_graph["n"] = n
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _worker_graph[name + "_block"] = block
+        _worker_graph[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+def _accumulate_chunk(sources):
+    return accumulate_paths(_worker_graph["indptr"], _worker_graph["indices"], sources, _worker_graph["n"])
+
+
+def sampling_error_bound(n, k, delta=0.05):
+    """
+    Returns the maximum error of the betweenness estimated from {k} random sources that holds for all
+    the {n} nodes at the same time with probability 1-{delta} (Hoeffding's inequality with a union bound
+    over the nodes: sqrt(ln(2n/delta) / 2k)). It is 0 if all the nodes are sources.
+    """
+    if k is None or k >= n:
+        return 0.0
+    return float(np.sqrt(np.log(2 * n / delta) / (2 * k)))
+
+
+def parallel_shortest_path_centrality(graph, k=None, seed=None, n_jobs=None, chunks_per_job=4):
+    """
+    Returns the betweenness and closeness centralities of the nodes of the GraphIndex {graph}
+    as `shortest_path_centrality` does, with the source nodes split across a pool of processes.
+
+    The CSR arrays are copied once into shared memory, every worker runs the breadth-first searches
+    of its chunks of sources and the partial sums of the chunks are added up at the end.
+
+    Parameters
+    ----------
+    graph : GraphIndex
+        The graph of follows.
+    k : int
+        If given, only {k} source nodes taken at random are used (see `sampling_error_bound` for the error).
+    seed : int
+        The seed of the sampling of the sources.
+    n_jobs : int
+        The number of processes. Defaults to the number of CPUs.
+    chunks_per_job : int
+        The sources are split in {n_jobs} * {chunks_per_job} chunks so that the workers that finish earlier take more.
+    """
+    n = graph.n_nodes
+    n_jobs = n_jobs or os.cpu_count() or 1
+    sources = sample_sources(n, k, seed)
+    if n_jobs == 1 or len(sources) < 2:
+        sums = accumulate_paths(np.asarray(graph.out_indptr), np.asarray(graph.out_indices), sources, n)
+        return finalize_paths(n, len(sources), *sums)
+    logger.info(f"Computing the shortest paths from {len(sources)}/{n} nodes with {n_jobs} processes...")
+    # Shuffle the sources so that the chunks have a similar cost
+    chunks = np.array_split(np.random.default_rng(seed).permutation(sources), min(len(sources), n_jobs * chunks_per_job))
+    blocks, specs = [], {}
+    try:
+        for name in ["indptr", "indices"]:
+            block, shared = _share_array(np.ascontiguousarray(getattr(graph, "out_" + name)))
+            blocks.append(block)
+            specs[name] = (block.name, shared.shape, shared.dtype)
+        with Pool(n_jobs, initializer=_attach_graph, initargs=(n, specs)) as pool:
+            sums = [np.zeros(n), np.zeros(n), np.zeros(n)]
+            for partial_sums in pool.imap_unordered(_accumulate_chunk, chunks):
+                for total, partial in zip(sums, partial_sums):
+                    total += partial
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    return finalize_paths(n, len(sources), *sums)
@@ -0,0 +1,198 @@
+import os, pickle, logging
+import numpy as np
+import pyarrow as pa
+import pyarrow.feather as feather
+import click
+
+from .fundamental import FUNDAMENTAL_METRICS
+
+logger = logging.getLogger(os.path.basename(__name__).split(".")[-1])
+
+RANK_TABLE_FILE = "rank_table.feather"
+
+# Rank tables already loaded by this process, by their path
+_loaded_tables = {}
+
+
+class RankTable:
+    """
+    Columnar table with the value and the position in the ranking of every streamer for each metric.
+
+    The rows are sorted by id so the row of a streamer is found with a binary search over the ids and,
+    for each metric, the table has the columns `{metric}` (the value), `{metric}_rank` (1 is the highest value)
+    and `{metric}_order` (the rows sorted by rank, so the top k are its first k entries).
+    It is stored as an uncompressed feather file and loaded memory-mapped.
+
+    Parameters
+    ----------
+    table : pa.Table
+        The arrow table with the column id and the columns of each metric.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.metrics = [m for m in table.column_names if f"{m}_rank" in table.column_names]
+        self._columns = {name: table.column(name).to_numpy() for name in table.column_names}
+        self.ids = self._columns["id"]
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_values(cls, ids, values):
+        """
+        Builds the table from the Twitch ids of the nodes and a dict with the values of each metric (one per node),
+        as returned by `compute_fundamental_metrics`. Ties are ranked by id.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        rows = np.argsort(ids, kind="stable")
+        rankings = {}
+        for metric, metric_values in values.items():
+            metric_values = np.asarray(metric_values)[rows]
+            order = np.argsort(-metric_values, kind="stable")
+            rankings[metric] = (order, metric_values[order])
+        return cls._from_orders(ids[rows], rankings)
+
+    @classmethod
+    def from_rankings(cls, rankings):
+        """
+        Builds the table from a dict with the ranking of each metric as {id (str): value} sorted by
+        descending value (the format of the pickles in data/fundamental_metrics).
+        """
+        ids = np.sort(np.array(list(next(iter(rankings.values())).keys()), dtype=np.int64))
+        orders = {}
+        for metric, ranking in rankings.items():
+            order = np.searchsorted(ids, np.array(list(ranking.keys()), dtype=np.int64))
+            orders[metric] = (order, np.array(list(ranking.values())))
+        return cls._from_orders(ids, orders)
+
+    @classmethod
+    def _from_orders(cls, ids, rankings):
+        """
+        Builds the table from the sorted ids and, for each metric, the rows sorted by rank and their values.
+        """
+        columns = {"id": ids}
+        for metric, (order, sorted_values) in rankings.items():
+            values = np.empty(len(ids), dtype=sorted_values.dtype)
+            values[order] = sorted_values
+            rank = np.empty(len(ids), dtype=np.int32)
+            rank[order] = np.arange(1, len(ids) + 1, dtype=np.int32)
+            columns[metric], columns[f"{metric}_rank"], columns[f"{metric}_order"] = values, rank, order.astype(np.int32)
+        return cls(pa.table(columns))
+
+    @classmethod
+    def from_pickles(cls, metrics_dir="data/fundamental_metrics", metrics=FUNDAMENTAL_METRICS):
+        """
+        Builds the table from the pickles {metrics_dir}/{metric}.pkl.
+        """
+        rankings = {}
+        for metric in metrics:
+            with open(os.path.join(metrics_dir, f"{metric}.pkl"), "rb") as f:
+                rankings[metric] = pickle.load(f)
+        return cls.from_rankings(rankings)
+
+    def save(self, path):
+        feather.write_feather(self.table, path, compression="uncompressed")
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a table saved with `save` memory-mapping its columns.
+        """
+        return cls(feather.read_table(pa.memory_map(path), memory_map=True))
+
+    def rows_of(self, user_ids):
+        """
+        Returns the rows of the given Twitch ids (an id or an array of them). Ids that are not in the table are mapped to -1.
+        """
+        user_ids = np.asarray(user_ids).astype(np.int64)
+        rows = np.searchsorted(self.ids, user_ids).clip(max=max(len(self.ids) - 1, 0))
+        return np.where(self.ids[rows] == user_ids, rows, -1)
+
+    def values(self, metric, user_ids=None):
+        """
+        Returns the values of {metric} of the given Twitch ids (or of all the rows, sorted by id).
+        Ids that are not in the table get NaN.
+        """
+        values = self._columns[metric]
+        if user_ids is None:
+            return values
+        rows = self.rows_of(user_ids)
+        found = rows >= 0
+        if np.all(found):
+            return values[rows]
+        result = np.asarray(values[np.where(found, rows, 0)], dtype=np.float64)
+        result[~found] = np.nan
+        return result
+
+    def ranks(self, user_id):
+        """
+        Returns a dict with the position (1 is the highest value) of the given Twitch id in the ranking of each metric.
+        """
+        row = int(self.rows_of(user_id))
+        if row < 0:
+            raise KeyError(f"The user with id {user_id} is not in the rank table")
+        return {metric: int(self._columns[f"{metric}_rank"][row]) for metric in self.metrics}
+
+    def top_k(self, metric, k=10):
+        """
+        Returns the Twitch ids of the {k} streamers with the highest value of {metric}, in order.
+        """
+        return self.ids[self._columns[f"{metric}_order"][:k]]
+
+
+def build_rank_table(metrics_dir="data/fundamental_metrics"):
+    """
+    Builds the RankTable of the pickles of the metrics in {metrics_dir} and saves it to {metrics_dir}/rank_table.feather.
+    """
+    path = os.path.join(metrics_dir, RANK_TABLE_FILE)
+    logger.info(f"Building the rank table of the metrics in {metrics_dir}...")
+    RankTable.from_pickles(metrics_dir).save(path)
+    _loaded_tables.pop(path, None)
+    return path
+
+
+def is_outdated(metrics_dir="data/fundamental_metrics"):
+    """
+    Returns True if the rank table of {metrics_dir} does not exist or any of the pickles of the metrics is newer.
+    """
+    path = os.path.join(metrics_dir, RANK_TABLE_FILE)
+    if not os.path.exists(path):
+        return True
+    pickles = [os.path.join(metrics_dir, f"{metric}.pkl") for metric in FUNDAMENTAL_METRICS]
+    return any(os.path.getmtime(p) > os.path.getmtime(path) for p in pickles if os.path.exists(p))
+
+
+def load_rank_table(metrics_dir="data/fundamental_metrics"):
+    """
+    Returns the RankTable of the metrics in {metrics_dir}. It is loaded once per process (memory-mapped) from
+    {metrics_dir}/rank_table.feather, which is built offline (python -m src.metrics.rank_table) or, if it does
+    not exist or the pickles of the metrics changed, the first time it is needed.
+    """
+    path = os.path.join(metrics_dir, RANK_TABLE_FILE)
+    if path not in _loaded_tables:
+        if is_outdated(metrics_dir):
+            build_rank_table(metrics_dir)
+        _loaded_tables[path] = RankTable.load(path)
+    return _loaded_tables[path]
+
+
+@click.command()
+@click.option("--metrics_dir", type=click.Path(exists=True), default="data/fundamental_metrics",
+    help="The directory with the pickles of the metrics (the one loaded by the dashboard)")
+def main(metrics_dir=None):
+    """
+    Build the rank table of the metrics of the dashboard:
+
+    python -m src.metrics.rank_table --metrics_dir data/fundamental_metrics
+    """
+    build_rank_table(metrics_dir)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s.%(funcName)s - %(levelname)s: %(message)s',
+        datefmt='%b %d %H:%M',
+        level=logging.INFO
+    )
+    main()
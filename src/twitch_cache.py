@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from urllib.parse import parse_qsl, urlencode
+
+DAY = 24 * 60 * 60
+
+# Time (in seconds) that the responses of each endpoint are considered fresh
+DEFAULT_TTL = {
+    "users/follows": 1 * DAY,
+    "users": 7 * DAY,
+    "channels": 7 * DAY,
+}
+
+
+class ResponseCache:
+    """
+    Persistent (SQLite) cache of the responses of the Twitch API.
+
+    Responses are keyed by the endpoint and its query parameters and each endpoint has its own
+    time to live, so re-running the pipeline reads from the local disk the data we already have
+    instead of fetching it again. It is thread-safe and can be shared by the sync and async clients.
+
+    Parameters
+    ----------
+    path : str
+        The path of the SQLite database.
+    ttl : dict
+        The time to live (in seconds) of the responses of each endpoint. Defaults to DEFAULT_TTL.
+    default_ttl : int
+        The time to live of the endpoints that are not in {ttl}.
+    """
+
+    def __init__(self, path, ttl=None, default_ttl=DAY):
+        self.path = path
+        self.ttl = dict(DEFAULT_TTL, **(ttl or {}))
+        self.default_ttl = default_ttl
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, endpoint TEXT, fetched_at REAL, data TEXT)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(endpoint, params=None):
+        """
+        Returns the endpoint (without query string) and a key that does not depend on the order of the parameters.
+        """
+        endpoint, _, query = endpoint.partition("?")
+        items = parse_qsl(query)
+        if params:
+            items += list(params.items()) if isinstance(params, dict) else list(params)
+        items = sorted((str(k), str(v)) for k, v in items)
+        return endpoint, f"{endpoint}?{urlencode(items)}"
+
+    def get_ttl(self, endpoint):
+        return self.ttl.get(endpoint, self.default_ttl)
+
+    def get(self, endpoint, params=None):
+        """
+        Returns the cached response of the request or None if it is not cached or has expired.
+        """
+        endpoint, key = self.make_key(endpoint, params)
+        with self._lock:
+            row = self._conn.execute("SELECT fetched_at, data FROM responses WHERE key=?", (key,)).fetchone()
+        if row is None or time.time() - row[0] > self.get_ttl(endpoint):
+            return None
+        return json.loads(row[1])
+
+    def set(self, endpoint, params, data):
+        """
+        Stores the response of a request.
+        """
+        endpoint, key = self.make_key(endpoint, params)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, endpoint, time.time(), json.dumps(data))
+            )
+            self._conn.commit()
+
+    def purge_expired(self):
+        """
+        Deletes the responses that have expired.
+        """
+        now = time.time()
+        with self._lock:
+            for endpoint, in self._conn.execute("SELECT DISTINCT endpoint FROM responses").fetchall():
+                self._conn.execute(
+                    "DELETE FROM responses WHERE endpoint=? AND fetched_at<?", (endpoint, now - self.get_ttl(endpoint))
+                )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
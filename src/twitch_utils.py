@@ -1,7 +1,14 @@
 import requests
+import aiohttp
+import asyncio
 import os
+import time
+import random
+import threading
 from dotenv import find_dotenv, load_dotenv
 
+from .twitch_cache import ResponseCache
+
 # load .env file
 dotenv = find_dotenv()
 load_dotenv(dotenv)
@@ -13,31 +20,403 @@ AutParams = {
     'client_secret': os.environ.get("TWITCH_CLIENT_SECRET"),
     'grant_type': 'client_credentials'
 }
+helixURL = "https://api.twitch.tv/helix"
+# Path of the persistent cache of the responses of the API (set it to an empty string to disable it)
+cachePath = os.environ.get("TWITCH_API_CACHE", "data/.cache/twitch_api.sqlite")
+# Seconds to wait to connect to the API and to read a response, so a stalled connection is retried instead of blocking forever
+REQUEST_TIMEOUT = (10, 30)
 
 
-def connect_to_twitch_endpoint(endpoint, params=None, **kwargs):
+class TwitchAPIError(Exception):
+    """
+    Raised when a request to the Twitch API returns an error that could not be solved by retrying it.
+    """
 
-    url = f"https://api.twitch.tv/helix/{endpoint}"
-    AutCall = requests.post(url=authURL, params=AutParams)
-    access_token = AutCall.json()['access_token']
-
-    head = {
-        'Client-ID': AutParams.get('client_id'),
-        'Authorization':  "Bearer " + access_token,
-    }
-
-    if not params:
-        params = {}
-    
-    params.update(kwargs)
-    response = requests.get(url, headers=head, params=params)
-
-    if response.status_code != 200:
-        raise Exception(
-            "Request to url {} returned an error: {} {}".format(
-                response.url, response.status_code, response.text
-            )
+    def __init__(self, url, status_code, text):
+        super().__init__(
+            "Request to url {} returned an error: {} {}".format(url, status_code, text)
         )
+        self.url = url
+        self.status_code = status_code
+
+
+class RateLimiter:
+    """
+    Token bucket that paces the requests made to the Twitch API so that they stay
+    just under the rate limit of the app.
+
+    The bucket refills continuously at {limit}*{headroom} points per {period} seconds and it is
+    reconciled with the `Ratelimit-Limit`, `Ratelimit-Remaining` and `Ratelimit-Reset`
+    headers of every response, so it also accounts for the points spent by other processes
+    that use the same credentials. It is thread-safe and can be shared by sync and async clients.
+
+    Parameters
+    ----------
+    limit : int
+        The number of points of the bucket (800 per minute for app access tokens).
+    period : float
+        The number of seconds it takes for the bucket to refill completely.
+    headroom : float
+        The fraction of the limit to use, to stay just under it.
+    """
+
+    def __init__(self, limit=800, period=60, headroom=0.95):
+        self.period = period
+        self.headroom = headroom
+        self._set_limit(limit)
+        self.tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0
+        self._lock = threading.Lock()
+
+    def _set_limit(self, limit):
+        self.limit = limit
+        self.capacity = limit * self.headroom
+        self.rate = self.capacity / self.period
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def reserve(self, cost=1):
+        """
+        Takes {cost} points from the bucket and returns the number of seconds
+        the caller must wait before making its request.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= cost
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+            return max(wait, self._blocked_until - now)
+
+    def acquire(self, cost=1):
+        """
+        Blocks until a request can be made.
+        """
+        wait = self.reserve(cost)
+        if wait > 0:
+            time.sleep(wait)
+
+    def update(self, headers):
+        """
+        Reconciles the bucket with the Ratelimit-* headers of a response of the API.
+        """
+        limit, remaining, reset = (headers.get(f"Ratelimit-{h}") for h in ("Limit", "Remaining", "Reset"))
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if limit is not None and int(limit) != self.limit:
+                self._set_limit(int(limit))
+            if remaining is not None:
+                # Keep (1-headroom) of the server's bucket as a safety margin
+                self.tokens = min(self.tokens, int(remaining) - self.limit * (1 - self.headroom))
+            if reset is not None and (remaining is None or int(remaining) <= 0):
+                self._blocked_until = max(self._blocked_until, now + int(reset) - time.time())
+
+    def backoff(self, attempt, headers=None, base=1, max_wait=60):
+        """
+        Returns the number of seconds to wait before retrying a failed request. If the
+        response was rate limited (429) it waits until the bucket is reset.
+        """
+        if headers is not None and headers.get("Ratelimit-Reset") is not None:
+            self.update(headers)
+            wait = int(headers.get("Ratelimit-Reset")) - time.time()
+            if wait > 0:
+                return min(wait, max_wait) + random.uniform(0, base)
+        return min(base * 2 ** attempt, max_wait) + random.uniform(0, base)
+
+
+_default_rate_limiter = None
+
+
+def get_default_rate_limiter():
+    """
+    Returns the RateLimiter shared by all the clients of the Twitch API of this process.
+    """
+    global _default_rate_limiter
+    if _default_rate_limiter is None:
+        _default_rate_limiter = RateLimiter()
+    return _default_rate_limiter
+
+
+class TwitchClient:
+    """
+    Reusable client of the Twitch Helix API.
+
+    It keeps a pool of keep-alive connections (a `requests.Session`) and caches the
+    app access token until shortly before it expires, so that a request to the API
+    does not have to pay for a new TLS handshake and a new token every time.
+
+    Parameters
+    ----------
+    client_id : str
+        The client id of the Twitch application. Defaults to the TWITCH_CLIENT_ID env variable.
+    client_secret : str
+        The client secret of the Twitch application. Defaults to the TWITCH_CLIENT_SECRET env variable.
+    pool_size : int
+        The maximum number of connections to keep alive in the pool.
+    refresh_margin : int
+        Number of seconds before the expiration of the token when a new one will be requested.
+    rate_limiter : RateLimiter
+        The rate limiter that paces the requests. Defaults to the one shared by the whole process.
+    max_retries : int
+        The number of times a request is retried (with backoff) when it is rate limited or the server fails.
+    cache : ResponseCache
+        The cache of the responses. Defaults to the one shared by the whole process. Use False to disable it.
+    timeout : tuple
+        The number of seconds to wait to connect to the API and to read each response before retrying the request.
+    """
+
+    def __init__(self, client_id=None, client_secret=None, pool_size=32, refresh_margin=300, rate_limiter=None, max_retries=5, cache=None,
+            timeout=REQUEST_TIMEOUT):
+        self.client_id = client_id or AutParams.get("client_id")
+        self.client_secret = client_secret or AutParams.get("client_secret")
+        self.refresh_margin = refresh_margin
+        self.rate_limiter = rate_limiter or get_default_rate_limiter()
+        self.max_retries = max_retries
+        self.cache = get_default_cache() if cache is None else cache or None
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self._access_token = None
+        self._token_expires_at = 0
+        self._token_lock = threading.Lock()
+
+    def get_access_token(self, force_refresh=False):
+        """
+        Returns the cached app access token, requesting a new one if
+        there is none or if it is about to expire.
+        """
+        with self._token_lock:
+            if force_refresh or self._access_token is None \
+                    or time.monotonic() >= self._token_expires_at - self.refresh_margin:
+                resp = self.session.post(url=authURL, params={
+                    'client_id': self.client_id,
+                    'client_secret': self.client_secret,
+                    'grant_type': 'client_credentials'
+                }, timeout=self.timeout)
+                resp.raise_for_status()
+                token = resp.json()
+                self._access_token = token['access_token']
+                self._token_expires_at = time.monotonic() + token.get('expires_in', 3600)
+            return self._access_token
+
+    def headers(self, force_refresh=False):
+        return {
+            'Client-ID': self.client_id,
+            'Authorization': "Bearer " + self.get_access_token(force_refresh),
+        }
+
+    def get(self, endpoint, params=None, **kwargs):
+        """
+        Makes a GET request to the given endpoint of the Helix API and returns the json response.
+
+        Parameters
+        ----------
+        endpoint : str
+            The endpoint of the API (e.g "users/follows"). It can include a query string.
+        params : dict
+            The query parameters of the request.
+        """
+        url = f"{helixURL}/{endpoint}"
+        params = dict(params or {}, **kwargs)
+        if self.cache is not None:
+            cached = self.cache.get(endpoint, params)
+            if cached is not None:
+                return cached
+        force_refresh = False
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            try:
+                response = self.session.get(url, headers=self.headers(force_refresh), params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.rate_limiter.backoff(attempt))
+                continue
+            self.rate_limiter.update(response.headers)
+            if response.status_code == 200:
+                data = response.json()
+                if self.cache is not None:
+                    self.cache.set(endpoint, params, data)
+                return data
+            if response.status_code == 401 and not force_refresh:
+                # The token was revoked or expired before we expected it
+                force_refresh = True
+                continue
+            force_refresh = False
+            if (response.status_code == 429 or response.status_code >= 500) and attempt < self.max_retries:
+                time.sleep(self.rate_limiter.backoff(
+                    attempt, response.headers if response.status_code == 429 else None))
+                continue
+            break
 
-    return response.json()
+        raise TwitchAPIError(response.url, response.status_code, response.text)
 
+    def close(self):
+        self.session.close()
+
+
+class AsyncTwitchClient:
+    """
+    Asynchronous counterpart of `TwitchClient` built on top of an aiohttp session.
+    It must be used as an async context manager:
+
+    ```
+    async with AsyncTwitchClient(concurrency=32) as client:
+        resp = await client.get("users", params=[("login", "ibai")])
+    ```
+
+    Parameters
+    ----------
+    client_id : str
+        The client id of the Twitch application. Defaults to the TWITCH_CLIENT_ID env variable.
+    client_secret : str
+        The client secret of the Twitch application. Defaults to the TWITCH_CLIENT_SECRET env variable.
+    concurrency : int
+        The maximum number of requests in flight at the same time.
+    refresh_margin : int
+        Number of seconds before the expiration of the token when a new one will be requested.
+    rate_limiter : RateLimiter
+        The rate limiter that paces the requests. Defaults to the one shared by the whole process.
+    max_retries : int
+        The number of times a request is retried (with backoff) when it is rate limited or the server fails.
+    cache : ResponseCache
+        The cache of the responses. Defaults to the one shared by the whole process. Use False to disable it.
+    timeout : tuple
+        The number of seconds to wait to connect to the API and to read each response before retrying the request.
+    """
+
+    def __init__(self, client_id=None, client_secret=None, concurrency=32, refresh_margin=300, rate_limiter=None, max_retries=5, cache=None,
+            timeout=REQUEST_TIMEOUT):
+        self.client_id = client_id or AutParams.get("client_id")
+        self.client_secret = client_secret or AutParams.get("client_secret")
+        self.concurrency = concurrency
+        self.refresh_margin = refresh_margin
+        self.rate_limiter = rate_limiter or get_default_rate_limiter()
+        self.max_retries = max_retries
+        self.cache = get_default_cache() if cache is None else cache or None
+        self.timeout = timeout
+        self.session = None
+        self._access_token = None
+        self._token_expires_at = 0
+        self._token_lock = None
+
+    async def __aenter__(self):
+        connect, read = self.timeout
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.concurrency),
+            timeout=aiohttp.ClientTimeout(total=None, connect=connect, sock_read=read))
+        self._token_lock = asyncio.Lock()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    async def get_access_token(self, force_refresh=False):
+        async with self._token_lock:
+            if force_refresh or self._access_token is None \
+                    or time.monotonic() >= self._token_expires_at - self.refresh_margin:
+                async with self.session.post(authURL, params={
+                    'client_id': self.client_id,
+                    'client_secret': self.client_secret,
+                    'grant_type': 'client_credentials'
+                }) as resp:
+                    resp.raise_for_status()
+                    token = await resp.json()
+                self._access_token = token['access_token']
+                self._token_expires_at = time.monotonic() + token.get('expires_in', 3600)
+            return self._access_token
+
+    async def headers(self, force_refresh=False):
+        return {
+            'Client-ID': self.client_id,
+            'Authorization': "Bearer " + await self.get_access_token(force_refresh),
+        }
+
+    async def get(self, endpoint, params=None):
+        """
+        Makes a GET request to the given endpoint of the Helix API and returns the json response.
+
+        Parameters
+        ----------
+        endpoint : str
+            The endpoint of the API (e.g "users/follows").
+        params : dict or list of tuples
+            The query parameters of the request. Use a list of tuples to repeat a parameter (e.g. several ids).
+        """
+        url = f"{helixURL}/{endpoint}"
+        if self.cache is not None:
+            cached = self.cache.get(endpoint, params)
+            if cached is not None:
+                return cached
+        force_refresh = False
+        for attempt in range(self.max_retries + 1):
+            wait = self.rate_limiter.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                async with self.session.get(url, headers=await self.headers(force_refresh), params=params) as response:
+                    self.rate_limiter.update(response.headers)
+                    if response.status == 200:
+                        data = await response.json()
+                        if self.cache is not None:
+                            self.cache.set(endpoint, params, data)
+                        return data
+                    status, headers, text, resp_url = response.status, response.headers, await response.text(), response.url
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(self.rate_limiter.backoff(attempt))
+                continue
+            if status == 401 and not force_refresh:
+                # The token was revoked or expired before we expected it
+                force_refresh = True
+                continue
+            force_refresh = False
+            if (status == 429 or status >= 500) and attempt < self.max_retries:
+                await asyncio.sleep(self.rate_limiter.backoff(attempt, headers if status == 429 else None))
+                continue
+            break
+
+        raise TwitchAPIError(resp_url, status, text)
+
+
+_default_cache = None
+
+
+def get_default_cache():
+    """
+    Returns the ResponseCache shared by all the clients of the Twitch API of this process
+    (stored at the path of the TWITCH_API_CACHE env variable), or None if it is disabled.
+    """
+    global _default_cache
+    if _default_cache is None and cachePath:
+        _default_cache = ResponseCache(cachePath)
+    return _default_cache or None
+
+
+def set_default_cache(cache):
+    """
+    Replaces the ResponseCache shared by the clients created after this call. Use False to disable it.
+    """
+    global _default_cache
+    _default_cache = cache
+
+
+_default_client = None
+
+
+def get_default_client():
+    """
+    Returns the TwitchClient shared by all the calls to `connect_to_twitch_endpoint`.
+    """
+    global _default_client
+    if _default_client is None:
+        _default_client = TwitchClient()
+    return _default_client
+
+
+def connect_to_twitch_endpoint(endpoint, params=None, **kwargs):
+    return get_default_client().get(endpoint, params=params, **kwargs)
@@ -1,12 +1,51 @@
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 from .twitch_utils import connect_to_twitch_endpoint
 
 from typing import List, Optional, Union
 from functools import lru_cache
+from array import array
 
+import numpy as np
 from pandas import isnull
 import pandas as pd
 
+# Maximum number of users whose follows are kept in memory by User.load_follows
+FOLLOWS_CACHE_SIZE = 4096
+
+# Dataset of streamers the follows of the users are read from (see `User.use_follows_dataset`)
+_follows_dataset = None
+
+
+def _pack_follows(user_follows):
+    """
+    Packs a list of user ids (or its string representation as read from a csv) into an array of 64-bit integers.
+    """
+    if isinstance(user_follows, array):
+        return user_follows
+    from .data.storage import _parse_follows
+    user_follows = _parse_follows(user_follows)
+    if user_follows is None:
+        return None
+    packed = array('q')
+    packed.frombytes(user_follows.tobytes())
+    return packed
+
+
+def _add_slots(cls):
+    """
+    Recreates the dataclass {cls} with __slots__ so that its instances don't carry a __dict__.
+    The user_follows field is stored packed in the _user_follows slot behind a property.
+    (Same as `@dataclass(slots=True)`, which needs python>=3.10)
+    """
+    cls_dict = dict(cls.__dict__)
+    field_names = tuple(f.name for f in fields(cls))
+    for name in field_names + ('__dict__', '__weakref__'):
+        cls_dict.pop(name, None)
+    cls_dict['__slots__'] = tuple(name for name in field_names if name != 'user_follows') + ('_user_follows',)
+    cls_dict['user_follows'] = property(cls._get_user_follows, cls._set_user_follows)
+    return type(cls)(cls.__name__, cls.__bases__, cls_dict)
+
+
 @dataclass
 class User:
     id: str = None
@@ -21,6 +60,22 @@ class User:
     created_at: str = None
     user_follows : list = None
 
+    def _get_user_follows(self):
+        # The ids of the users this user follows as a list of strings (as returned by the API)
+        if self._user_follows is None:
+            return None
+        return [str(user_id) for user_id in self._user_follows]
+
+    def _set_user_follows(self, user_follows):
+        self._user_follows = _pack_follows(user_follows)
+
+    @property
+    def follow_ids(self):
+        """
+        The ids of the users this user follows as a packed array of integers (None if they have not been retrieved)
+        """
+        return self._user_follows
+
     def __hash__(self):
         # Used for storing users in a set. Uniqueness is checked by id
         return hash(self.id)
@@ -42,26 +97,48 @@ class User:
         raise TypeError("Cannot compare User to {}".format(type(other)))        
 
     @property
-    @lru_cache()
     def follows(self):
         """
-        (cached property) Returns a list of all users this user follows 
+        Returns a list of all users this user follows: its user_follows if they are set, otherwise they are
+        loaded with `User.load_follows` (and not kept in the user, so only the cache of the last loaded ones is in memory).
         """
-        if not isnull(self.user_follows):
+        if self._user_follows is not None:
             return self.user_follows
-        self.user_follows = User.get_user_follows(self)
-        return self.user_follows
+        follows = User.load_follows(str(self.id))
+        return None if follows is None else [str(user_id) for user_id in follows]
     
     def get_follows(self):
         """
         Returns a list of all users this user follows
         """
-        if not isnull(self.user_follows):
-            return self.user_follows
         return self.follows
 
     @staticmethod
-    @lru_cache()
+    def use_follows_dataset(path):
+        """
+        Sets the dataset of streamers (as written by `write_dataset`) the follows of the users are loaded from,
+        or None to fetch them from the API.
+        """
+        global _follows_dataset
+        if path != _follows_dataset:
+            _follows_dataset = path
+            User.load_follows.cache_clear()
+
+    @staticmethod
+    @lru_cache(maxsize=FOLLOWS_CACHE_SIZE)
+    def load_follows(user_id):
+        """
+        Returns the ids of the users that the user with the given id follows as a packed array of integers (or None
+        if they are not stored). They are read from the dataset set with `User.use_follows_dataset` (memory-mapped
+        if it is a feather file) or, if there is none, fetched from the API. The follows of the last FOLLOWS_CACHE_SIZE
+        users are kept in memory.
+        """
+        if _follows_dataset is None:
+            return _pack_follows(User.get_user_follows(user_id))
+        from .data.storage import load_follows_store
+        return _pack_follows(load_follows_store(_follows_dataset).get(user_id))
+
+    @staticmethod
     def get_user_follows(user_or_id:Union[object,str]):
         """
         Returns a list of User objects that the given user follows.
@@ -74,27 +151,21 @@ class User:
             user_id = user_or_id.id
         else:
             user_id = user_or_id
-        try:
-            follows_from_resp = connect_to_twitch_endpoint(
-                "users/follows", params=dict(from_id=user_id, first=100))
-        except Exception as e:
-            print(e)
-            return []
+        # Errors are not caught here (the client already retries them) so that a
+        # partial list of follows is never returned as if it were complete
+        follows_from_resp = connect_to_twitch_endpoint(
+            "users/follows", params=dict(from_id=user_id, first=100))
         follows = [follow["to_id"]
                     for follow in follows_from_resp.get("data")]
         while follows_from_resp.get("pagination"):
-            try:
-                cursor = follows_from_resp.get(
-                    "pagination", dict()).get("cursor")
-                if cursor:
-                    follows_from_resp = connect_to_twitch_endpoint(
-                        "users/follows", params=dict(from_id=user_id, first=100, after=cursor))
-                    follows = follows + [follow["to_id"]
-                                            for follow in follows_from_resp["data"]]
-                else:
-                    break
-            except Exception as e:
-                print(e)
+            cursor = follows_from_resp.get(
+                "pagination", dict()).get("cursor")
+            if cursor:
+                follows_from_resp = connect_to_twitch_endpoint(
+                    "users/follows", params=dict(from_id=user_id, first=100, after=cursor))
+                follows.extend(follow["to_id"]
+                                for follow in follows_from_resp["data"])
+            else:
                 break
         return follows
     
@@ -105,7 +176,6 @@ class User:
         return self.num_followers
 
     @staticmethod
-    @lru_cache()
     def get_num_followers_of_user(user_or_id:Union[object,str]):
         """
         Returns the number of followers of the User object or the user with the given id.
@@ -130,10 +200,26 @@ class User:
         Uses a list of user ids or names to retrieve the user's data
         and return a list of new User objects.
         """
+        return [User(**record) for record in User.get_users_records(user_ids, user_names)]
+
+    @staticmethod
+    def get_users_df(user_ids: list = None, user_names: list = None):
+        """
+        Uses a list of user ids or names to retrieve the user's data
+        and return it as a pandas dataframe (one row per user) without making User objects.
+        """
+        return pd.DataFrame(User.get_users_records(user_ids, user_names), columns=USER_FIELDS)
+
+    @staticmethod
+    def get_users_records(user_ids: list = None, user_names: list = None):
+        """
+        Uses a list of user ids or names to retrieve the user's data
+        and return a list of dicts with the fields of a User.
+        """
         if user_names:
             user_ids = [connect_to_twitch_endpoint(
                 "users?login="+name)["data"][0]["id"] for name in user_names]
-        users_list = []
+        records = []
         # Get users by 100s
         while len(user_ids) > 0:
             users = user_ids[:100]
@@ -145,39 +231,45 @@ class User:
             resp_channel = connect_to_twitch_endpoint(
                 f'channels?broadcaster_id={user_channels_str}')
             channel_data = resp_channel["data"]
-            for i, user_dict in enumerate(user_data):
-                user_name = user_dict.get("display_name")
-                user_id = user_dict.get("id")
-                created_at = user_dict.get("created_at")
-                description = user_dict.get("description")
-                broadcaster_type = user_dict.get("broadcaster_type")
-                profile_image_url = user_dict.get("profile_image_url")
-                view_count = user_dict.get("view_count")
-                user_channel_data = [channel for channel in channel_data if channel.get("broadcaster_id") == user_id]
-                if user_channel_data:
-                    lang = user_channel_data[0].get("broadcaster_language")
-                    last_game_played_name = user_channel_data[0].get("game_name")
-                else:
-                    lang = None
-                    last_game_played_name = None                
-
-                user = User(
-                    id=user_id,
-                    name=user_name,
-                    created_at=created_at,
-                    broadcaster_type=broadcaster_type,
-                    profile_image_url=profile_image_url,
-                    description=description,
-                    view_count=view_count,
-                    lang=lang,
-                    last_game_played_name=last_game_played_name
-                )
-                users_list.append(user)
+            records += User.records_from_api_data(user_data, channel_data)
 
-        return users_list
+        return records
     
     @staticmethod
-    @lru_cache()
+    def from_api_data(user_data: list, channel_data: list):
+        """
+        Makes a list of User objects from the data of the responses
+        of the users and channels endpoints of the Twitch API.
+        """
+        return [User(**record) for record in User.records_from_api_data(user_data, channel_data)]
+
+    @staticmethod
+    def records_from_api_data(user_data: list, channel_data: list):
+        """
+        Joins the data of the responses of the users and channels endpoints
+        of the Twitch API by id and returns a list of dicts with the fields of a User.
+        """
+        channels = {channel.get("broadcaster_id"): channel for channel in channel_data}
+        records = []
+        for user_dict in user_data:
+            user_id = user_dict.get("id")
+            channel = channels.get(user_id, {})
+            records.append(dict(
+                id=user_id,
+                name=user_dict.get("display_name"),
+                num_followers=None,
+                broadcaster_type=user_dict.get("broadcaster_type"),
+                description=user_dict.get("description"),
+                lang=channel.get("broadcaster_language"),
+                last_game_played_name=channel.get("game_name"),
+                view_count=user_dict.get("view_count"),
+                profile_image_url=user_dict.get("profile_image_url"),
+                created_at=user_dict.get("created_at"),
+                user_follows=None,
+            ))
+        return records
+
+    @staticmethod
     def from_id(user_id=None):
         """
         Use a user id to retrieve the user's data and make a User object.
@@ -188,7 +280,6 @@ class User:
         return User.get_users(user_ids=[user_id])[0]
     
     @staticmethod
-    @lru_cache()
     def from_name(user_name=None):
         """
         Use a user name to retrieve the user's data and make a User object.
@@ -229,8 +320,14 @@ class User:
         if self.id is None and self.name is None:
             raise Exception("No user id or user name attributes have been set")
         if self.id:
-            user = User.get_user(user_id=self.id)
+            user = User.from_id(user_id=self.id)
         else:
-            user = User.get_user(user_name=self.name)
-        self.__dict__.update(user.__dict__)
-        
\ No newline at end of file
+            user = User.from_name(user_name=self.name)
+        for f in fields(User):
+            setattr(self, f.name, getattr(user, f.name))
+
+
+User = _add_slots(User)
+
+# The columns of a dataframe of users
+USER_FIELDS = [f.name for f in fields(User)]
@@ -1,25 +1,50 @@
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 
-def remove_outside_follows(df):
+from .data.storage import follows_to_arrow
+
+def filter_follows(ids, user_follows):
+    """
+    Remove the follows that are not in ids from every list of user_follows, without looping over the rows
+
+    The follows are flattened to their CSR representation (offsets and values), the values are looked up
+    in the sorted ids with a binary search and the offsets of the kept values are recomputed with a cumulative sum.
+    Returns the filtered follows as an arrow list<int64> array (null follows become empty lists).
+    """
+    ids = np.sort(np.asarray(ids, dtype=np.int64))
+    user_follows = follows_to_arrow(user_follows)
+    lengths = pc.fill_null(pc.list_value_length(user_follows), 0).to_numpy()
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    values = pc.list_flatten(user_follows).to_numpy()
+
+    positions = np.searchsorted(ids, values).clip(max=max(len(ids) - 1, 0))
+    keep = ids[positions] == values if len(ids) else np.zeros(len(values), dtype=bool)
+    kept_before = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum(keep, out=kept_before[1:])
+    return pa.ListArray.from_arrays(pa.array(kept_before[offsets], type=pa.int32()), pa.array(values[keep]))
+
+def remove_outside_follows(df, output="pandas"):
     """
     Remove ids from df.user_follows that are not in df.id
 
-    It expects a dataframe with columns id and user_follows
+    It expects a dataframe with columns id and user_follows. See `filter_follows`.
+    output: "pandas" to return the dataframe indexed by id with the filtered follows as arrays, "numpy" to return the
+        ids and the filtered follows as CSR arrays (ids, indptr, indices) or "arrow" to return them as a list array
     """
-    df_streamers = df.copy()
+    df_streamers = df
 
     if "id" not in df_streamers.columns:
         df_streamers = df_streamers.reset_index()
 
-    # remove those ids in user_follows that are not in df_streamers.id
-    df_streamers_exploded = df_streamers.explode("user_follows")
-    df_streamers_exploded = df_streamers_exploded[df_streamers_exploded["user_follows"].isin(df_streamers.id)]
-    user_follows_arrays = df_streamers_exploded.groupby("id").user_follows.apply(list).reset_index()
-    df_streamers = df_streamers.set_index("id")
-    df_streamers.loc[user_follows_arrays.id,"user_follows"] = user_follows_arrays.user_follows.values
-
-    # Make those that appear as nan or are not in the index to be empty arrays
-    not_in_set_or_null = ~df_streamers.index.isin(user_follows_arrays.id)
-    df_streamers.loc[not_in_set_or_null,"user_follows"] =  pd.Series([[]]*not_in_set_or_null.sum()).values
+    ids = pd.to_numeric(df_streamers["id"]).astype("int64").values
+    follows = filter_follows(ids, df_streamers["user_follows"])
 
-    return df_streamers
\ No newline at end of file
+    if output == "arrow":
+        return follows
+    if output == "numpy":
+        return ids, follows.offsets.to_numpy().astype(np.int64), follows.values.to_numpy()
+    df_streamers = df_streamers.assign(id=ids, user_follows=follows.to_pandas().values).set_index("id")
+    return df_streamers
@@ -0,0 +1,29 @@
+import pandas as pd
+
+from src.data.checkpoint import CrawlJournal, apply_journal_updates
+from src.data.storage import set_fetched_at
+from src.user import User
+
+
+def test_journal_keeps_the_fetch_times(tmp_path):
+    journal = CrawlJournal(str(tmp_path / "crawl.journal"))
+    journal.write_users([User(id="1"), User(id="2")])
+    journal.write_visited(User(id="1", user_follows=["2"]))
+    journal.write_update("2", num_followers=10, num_followers_fetched_at="2024-01-01T00:00:00+00:00")
+    journal.close()
+    state = journal.load()
+    assert set(state.fetched_at["profile"]) == {"1", "2"}
+    assert list(state.fetched_at["follows"]) == ["1"]
+
+    df = apply_journal_updates(pd.DataFrame({"id": ["1", "2"], "num_followers": [None, None]}), state.updates)
+    df = set_fetched_at(df, "num_followers", {})
+    assert df["num_followers_fetched_at"].isnull().tolist() == [True, False]
+    assert df["num_followers_fetched_at"].iloc[1] == pd.Timestamp("2024-01-01", tz="UTC")
+
+
+def test_set_fetched_at_keeps_the_previous_times():
+    df = pd.DataFrame({"id": [1, 2, 3]})
+    df = set_fetched_at(df, "follows", {"1": "2024-01-01T00:00:00+00:00"})
+    df = set_fetched_at(df, "follows", {"2": "2024-02-01T00:00:00+00:00"})
+    assert df["follows_fetched_at"].tolist()[:2] == [pd.Timestamp("2024-01-01", tz="UTC"), pd.Timestamp("2024-02-01", tz="UTC")]
+    assert pd.isnull(df["follows_fetched_at"].iloc[2])
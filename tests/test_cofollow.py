@@ -0,0 +1,17 @@
+import numpy as np
+import pandas as pd
+
+from src.cofollow import CoFollowIndex
+
+
+def test_cofollow_index_with_string_ids():
+    df = pd.DataFrame({
+        "id": ["1", "2", "3"],
+        "name": ["Ibai", "b", "c"],
+        "user_follows": [np.array([2, 3]), np.array([3]), np.array([2])],
+    })
+    index = CoFollowIndex.from_df(df)
+    assert list(index.names) == ["Ibai", "b", "c"]
+    nodes, weights = index.top_k("ibai")
+    assert sorted(index.names[nodes]) == ["b", "c"]
+    assert np.allclose(weights, 0.5)
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyvis")
+pytest.importorskip("matplotlib")
+
+from src.data.storage import write_dataset
+from src.graph_utils import get_top_followers
+
+
+def make_streamers():
+    # Rows not sorted by id, so the order of the dataset and the order of the ids differ
+    return pd.DataFrame({
+        "id": [5, 3, 9, 1, 7],
+        "name": ["root", "c", "a", "d", "b"],
+        "user_follows": [np.array([9, 7, 3, 1]), np.array([9, 1]), np.array([7]), None, np.array([3, 9])],
+    })
+
+
+def edges_of(df):
+    return sorted(zip(df["source"], df["target"]))
+
+
+def test_top_followers_with_string_ids():
+    df = make_streamers()
+    df_str = df.assign(id=df["id"].astype(str),
+        user_follows=[None if f is None else [str(x) for x in f] for f in df["user_follows"]])
+    expected = edges_of(get_top_followers(df, k=2, common_followers_with="root"))
+    assert expected == edges_of(get_top_followers(df_str, k=2, common_followers_with="root"))
+    assert len(expected) > 2
+
+
+def test_top_followers_of_dataset_keep_the_order_of_the_dataset(tmp_path):
+    df = make_streamers()
+    path = str(tmp_path / "streamers.feather")
+    write_dataset(df, path)
+    # The first 2 follows of root in the dataset (with known follows) are c and a, not the smallest ids
+    from_file = get_top_followers(path, k=2, common_followers_with="root")
+    assert set(from_file["target"][from_file["source"] == "root"]) == {"c", "a"}
+    assert edges_of(from_file) == edges_of(get_top_followers(df, k=2, common_followers_with="root"))
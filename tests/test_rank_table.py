@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from src.metrics.rank_table import RankTable
+
+
+def make_table():
+    return RankTable.from_values([30, 10, 20], {"nx_cores": np.array([1, 3, 2]), "pagerank": np.array([0.2, 0.5, 0.3])})
+
+
+def test_values_of_known_ids():
+    table = make_table()
+    assert table.values("nx_cores", [10, 30]).tolist() == [3, 1]
+
+
+def test_values_of_unknown_ids_are_nan():
+    table = make_table()
+    values = table.values("nx_cores", [20, 99, 5])
+    assert values[0] == 2
+    assert np.isnan(values[1:]).all()
+    assert np.isnan(table.values("pagerank", 99))
+
+
+def test_ranks_of_unknown_id():
+    with pytest.raises(KeyError):
+        make_table().ranks(99)
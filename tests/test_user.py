@@ -0,0 +1,29 @@
+import pandas as pd
+import pytest
+
+from src.data.storage import write_dataset
+from src.user import User
+
+
+@pytest.fixture
+def follows_dataset(tmp_path):
+    path = str(tmp_path / "streamers.feather")
+    df = pd.DataFrame({"id": ["3", "1", "2"], "name": ["c", "a", "b"], "user_follows": [[1, 2], None, [99, 3]]})
+    write_dataset(df, path)
+    User.use_follows_dataset(path)
+    yield path
+    User.use_follows_dataset(None)
+
+
+def test_follows_are_read_from_the_dataset(follows_dataset):
+    assert User(id="2").follows == ["99", "3"]
+    assert User(id=3).follows == ["1", "2"]
+    assert User(id="1").follows is None
+    assert User(id="7").follows is None
+
+
+def test_follows_are_not_kept_in_the_user(follows_dataset):
+    user = User(id="3")
+    assert user.follows == ["1", "2"]
+    assert user.user_follows is None
+    assert User(id="3", user_follows=["5"]).follows == ["5"]